@@ -7,52 +7,51 @@ from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 
 from app.db.database import SessionLocal
-from app.db import models
+from app.db import models, crud
 from app.schemas.documents import (
     UploadResponse, UploadManyResponse,
     DocumentListItem, DocumentListResponse,
-    DocumentResponse, PageInfo, Classification
+    DocumentResponse, DocumentStatusResponse, PageInfo, Classification,
+    BulkDeleteRequest, BulkDeleteResponse
 )
-from app.services.parsing_service import parse_document
-from app.services.chunking import chunk_pages
-from app.services.embeddings import EmbeddingService
-from app.services.vector_store_qdrant import VectorStore
-from app.services.ai_processor import AIProcessor
+from app.services.vector_store import get_vector_store
+from app.services.ingest_pipeline import run_pipeline, reset_document
+from app.services.storage import store_upload
 from app.core.config import settings
+from app.worker import enqueue_document
 
 router = APIRouter()
 
-def _persist_document_and_pages(
+def _create_document(
     db: Session,
     doc_id: str,
     storage_uri: str,
     filename: str,
     content_type: Optional[str],
-    pages,
-    meta
+    status: str,
+    content_sha256: Optional[str] = None,
 ):
     document = models.Document(
         id=doc_id,
         filename=filename,
         mime_type=content_type or "",
         storage_uri=storage_uri,
-        language_primary=getattr(meta, "language_primary", None),
-        ocr_applied=bool(getattr(meta, "ocr_applied", False)),
-        page_count=len(pages),
+        content_sha256=content_sha256,
+        page_count=0,
+        status=status,
+        stage="queued" if status == models.STATUS_QUEUED else None,
     )
     db.add(document)
-    for p in pages:
-        page_row = models.Page(
-            doc_id=doc_id,
-            page_number=p.page_number,
-            text_raw=p.text_raw,
-            text_ocr=p.text_ocr,
-            lang_detected=p.lang_detected,
-            has_images=p.has_images,
-        )
-        db.add(page_row)
     db.commit()
 
+def _find_existing_document(db: Session, content_sha256: str) -> Optional[models.Document]:
+    """Latest document with the same content hash that has not failed."""
+    return db.query(models.Document)\
+        .filter(models.Document.content_sha256 == content_sha256)\
+        .filter(models.Document.status != models.STATUS_FAILED)\
+        .order_by(models.Document.created_at.desc())\
+        .first()
+
 def _load_document_full(db: Session, doc_id: str) -> DocumentResponse:
     d: Optional[models.Document] = db.query(models.Document).filter(models.Document.id == doc_id).first()
     if not d:
@@ -95,17 +94,28 @@ def _load_document_full(db: Session, doc_id: str) -> DocumentResponse:
         pages=page_infos
     )
 
+def _enqueue_document(doc_id: str):
+    """
+    Hands the heavy pipeline (parse/OCR, embed, index, LLM, VLM) to the
+    Celery stage queues; the upload request returns without waiting for it.
+    """
+    try:
+        enqueue_document(doc_id)
+    except Exception as e:
+        with SessionLocal() as db:
+            crud.set_document_status(db, doc_id, models.STATUS_FAILED, stage="queued", error=f"Could not queue: {e}")
+        raise
+
 @router.post("/upload", response_model=UploadManyResponse)
 def upload_documents(
-    files: List[UploadFile] = File(..., description="Repeat 'files' for multiple uploads")
+    files: List[UploadFile] = File(..., description="Repeat 'files' for multiple uploads"),
+    async_mode: Optional[bool] = Query(None, alias="async", description="Queue processing on the worker and return 202 (defaults to INGEST_ASYNC)"),
 ):
     if not files:
         raise HTTPException(status_code=422, detail="No files found. Send multipart/form-data with one or more 'files' parts.")
 
+    queued = settings.INGEST_ASYNC if async_mode is None else async_mode
     os.makedirs(settings.STORAGE_DIR, exist_ok=True)
-    emb = EmbeddingService()
-    vs = VectorStore()
-    ai = AIProcessor()
 
     results: List[UploadResponse] = []
 
@@ -121,47 +131,57 @@ def upload_documents(
                     detail=f"Unsupported type for {uf.filename}. Only .pdf, .docx, .png, .jpg, .jpeg are supported."
                 )
 
-            doc_id = str(uuid.uuid4())
-            storage_uri = os.path.join(settings.STORAGE_DIR, f"{doc_id}{ext}")
-
-            content = uf.file.read()
-            if not content:
+            # Stream to disk in blocks while hashing; files are stored by content hash
+            storage_uri, sha256, size = store_upload(uf.file, ext)
+            if not size:
                 raise HTTPException(status_code=400, detail=f"{uf.filename} is empty.")
-            with open(storage_uri, "wb") as f:
-                f.write(content)
-
-            pages, meta = parse_document(storage_uri)
 
-            # Persist
             with SessionLocal() as db:
-                _persist_document_and_pages(db, doc_id, storage_uri, uf.filename, uf.content_type, pages, meta)
+                existing = _find_existing_document(db, sha256)
+                if existing:
+                    # Exact same bytes already ingested (or in progress): reuse its results
+                    results.append(UploadResponse(
+                        doc_id=existing.id,
+                        filename=uf.filename,
+                        page_count=existing.page_count or 0,
+                        ocr_applied=bool(existing.ocr_applied),
+                        language_primary=existing.language_primary,
+                        status=existing.status,
+                        duplicate=True,
+                    ))
+                    continue
 
-            # Chunk + embeddings + Qdrant
-            chunks = chunk_pages(pages, doc_id=doc_id)
-            vectors = emb.embed_chunks(chunks)
-            vs.upsert_chunks(doc_id, chunks, vectors)
+                doc_id = str(uuid.uuid4())
+                _create_document(
+                    db, doc_id, storage_uri, uf.filename, uf.content_type,
+                    status=models.STATUS_QUEUED if queued else models.STATUS_PROCESSING,
+                    content_sha256=sha256,
+                )
 
-            # AI analysis (summary, classification, extraction)
-            outputs = ai.process_document(chunks)
-            with SessionLocal() as db:
-                ai_out = models.AIOutput(
+            if queued:
+                _enqueue_document(doc_id)
+                results.append(UploadResponse(
                     doc_id=doc_id,
-                    summary=outputs.summary,
-                    classification=outputs.classification.label,
-                    classification_confidence=outputs.classification.confidence,
-                    extraction=outputs.extraction,
-                    model_version=outputs.model_version,
-                )
-                db.add(ai_out)
-                db.commit()
+                    filename=uf.filename,
+                    page_count=0,
+                    ocr_applied=False,
+                    status=models.STATUS_QUEUED,
+                ))
+                continue
 
-            results.append(UploadResponse(
-                doc_id=doc_id,
-                filename=uf.filename,
-                page_count=len(pages),
-                ocr_applied=bool(getattr(meta, "ocr_applied", False)),
-                language_primary=getattr(meta, "language_primary", None),
-            ))
+            # Parse + persist pages, chunk + embeddings + Qdrant, AI analysis
+            run_pipeline(doc_id)
+
+            with SessionLocal() as db:
+                d = db.query(models.Document).filter(models.Document.id == doc_id).first()
+                results.append(UploadResponse(
+                    doc_id=doc_id,
+                    filename=uf.filename,
+                    page_count=d.page_count or 0,
+                    ocr_applied=bool(d.ocr_applied),
+                    language_primary=d.language_primary,
+                    status=d.status,
+                ))
         except HTTPException as he:
             results.append(UploadResponse(
                 doc_id="",
@@ -181,7 +201,10 @@ def upload_documents(
                 error=str(e)
             ))
 
-    return JSONResponse(content=UploadManyResponse(results=[r.model_dump() for r in results]).model_dump())
+    return JSONResponse(
+        content=UploadManyResponse(results=[r.model_dump() for r in results]).model_dump(),
+        status_code=202 if queued else 200,
+    )
 
 @router.get("", response_model=DocumentListResponse)
 def list_documents(limit: int = Query(100, ge=1, le=500), offset: int = Query(0, ge=0)):
@@ -205,32 +228,124 @@ def get_document(doc_id: str):
     with SessionLocal() as db:
         return _load_document_full(db, doc_id)
 
-@router.delete("/{doc_id}")
-def delete_document(doc_id: str):
+@router.get("/{doc_id}/status", response_model=DocumentStatusResponse)
+def get_document_status(doc_id: str):
     with SessionLocal() as db:
         d: Optional[models.Document] = db.query(models.Document).filter(models.Document.id == doc_id).first()
         if not d:
             raise HTTPException(status_code=404, detail="Document not found")
+        return DocumentStatusResponse(
+            doc_id=d.id,
+            status=d.status,
+            stage=d.stage,
+            checkpoints=list(d.checkpoints or []),
+            page_count=d.page_count or 0,
+            error=d.error,
+        )
 
-        # Remove from vector store (best-effort)
-        try:
-            vs = VectorStore()
-            vs.delete_document(doc_id)
-        except Exception:
-            pass
+@router.post("/{doc_id}/reprocess", response_model=DocumentStatusResponse)
+def reprocess_document(
+    doc_id: str,
+    async_mode: Optional[bool] = Query(None, alias="async", description="Queue on the worker instead of running inline (defaults to INGEST_ASYNC)"),
+    force: bool = Query(False, description="Discard checkpoints and start again from parsing, even if the document looks queued or processing"),
+):
+    """
+    Re-runs the ingestion pipeline for a document, resuming from the first
+    stage without a checkpoint (e.g. only the LLM step after an Ollama failure).
+    With force=true a document stuck in QUEUED/PROCESSING (lost task, killed
+    worker) is restarted as well.
+    """
+    queued = settings.INGEST_ASYNC if async_mode is None else async_mode
+    with SessionLocal() as db:
+        d: Optional[models.Document] = db.query(models.Document).filter(models.Document.id == doc_id).first()
+        if not d:
+            raise HTTPException(status_code=404, detail="Document not found")
+        if not force and d.status in (models.STATUS_QUEUED, models.STATUS_PROCESSING):
+            raise HTTPException(status_code=409, detail=f"Document is already {d.status.lower()}")
 
-        # Delete related rows
-        db.query(models.AIOutput).filter(models.AIOutput.doc_id == doc_id).delete()
-        db.query(models.Page).filter(models.Page.doc_id == doc_id).delete()
+    if force:
+        reset_document(doc_id)
 
-        # Delete stored file
+    if queued:
+        with SessionLocal() as db:
+            crud.set_document_status(db, doc_id, models.STATUS_QUEUED, stage="queued")
+        _enqueue_document(doc_id)
+    else:
         try:
-            if getattr(d, "storage_uri", None) and os.path.exists(d.storage_uri):
-                os.remove(d.storage_uri)
+            run_pipeline(doc_id)
         except Exception:
-            pass
+            pass  # recorded on the document by run_pipeline
+
+    return get_document_status(doc_id)
+
+def _delete_vectors(doc_ids: List[str]) -> bool:
+    """Removes the documents' points; on failure the orphan reconciler cleans up later."""
+    try:
+        get_vector_store().delete_documents(doc_ids)
+        return True
+    except Exception as e:
+        print(f"Vector store delete failed for {len(doc_ids)} documents: {e}")
+        return False
+
+def _delete_document_rows(db: Session, d: models.Document):
+    doc_id = d.id
+    # Delete related rows
+    db.query(models.AIOutput).filter(models.AIOutput.doc_id == doc_id).delete()
+    db.query(models.Page).filter(models.Page.doc_id == doc_id).delete()
+    db.query(models.Image).filter(models.Image.doc_id == doc_id).delete()
+
+    storage_uri = getattr(d, "storage_uri", None)
+    db.delete(d)
+    # Flush so documents deleted earlier in the same session (bulk delete) no longer count as references
+    db.flush()
+
+    # Delete stored file (content-addressed, so keep it while other documents point at it)
+    try:
+        shared = db.query(models.Document).filter(models.Document.storage_uri == storage_uri).count()
+        if not shared and storage_uri and os.path.exists(storage_uri):
+            os.remove(storage_uri)
+    except Exception:
+        pass
+
+@router.post("/bulk-delete", response_model=BulkDeleteResponse)
+def bulk_delete_documents(req: BulkDeleteRequest):
+    """
+    Deletes many documents by id and/or by upload date, classification or
+    mime type. Their vectors are removed through the indexed doc_id filter
+    (batched), never by scanning the collection.
+    """
+    if not (req.doc_ids or req.classification or req.mime_type or req.uploaded_from or req.uploaded_to):
+        raise HTTPException(status_code=400, detail="Give doc_ids or at least one filter")
+    with SessionLocal() as db:
+        q = db.query(models.Document)
+        if req.doc_ids:
+            q = q.filter(models.Document.id.in_(req.doc_ids))
+        if req.mime_type:
+            q = q.filter(models.Document.mime_type.in_(req.mime_type))
+        if req.uploaded_from:
+            q = q.filter(models.Document.created_at >= req.uploaded_from)
+        if req.uploaded_to:
+            q = q.filter(models.Document.created_at <= req.uploaded_to)
+        if req.classification:
+            q = q.join(models.AIOutput, models.AIOutput.doc_id == models.Document.id)\
+                .filter(models.AIOutput.classification.in_(req.classification))
+        docs = q.all()
+        doc_ids = [d.id for d in docs]
+        vectors_deleted = _delete_vectors(doc_ids) if doc_ids else True
+        for d in docs:
+            _delete_document_rows(db, d)
+        db.commit()
+    return BulkDeleteResponse(deleted=len(doc_ids), doc_ids=doc_ids, vectors_deleted=vectors_deleted)
+
+@router.delete("/{doc_id}")
+def delete_document(doc_id: str):
+    with SessionLocal() as db:
+        d: Optional[models.Document] = db.query(models.Document).filter(models.Document.id == doc_id).first()
+        if not d:
+            raise HTTPException(status_code=404, detail="Document not found")
 
-        db.delete(d)
+        vectors_deleted = _delete_vectors([doc_id])
+        _delete_document_rows(db, d)
         db.commit()
 
-        return JSONResponse(content={"status": "ok", "doc_id": doc_id})
\ No newline at end of file
+        return JSONResponse(content={"status": "ok", "doc_id": doc_id, "vectors_deleted": vectors_deleted})
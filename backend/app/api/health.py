@@ -4,7 +4,10 @@ from sqlalchemy import text
 from app.db.database import SessionLocal
 from app.core.config import settings
 from app.core.model_registry import get_runtime, get_model_config
-from qdrant_client import QdrantClient
+from app.services import ocr_cache
+from app.services.embeddings import EmbeddingService
+from app.services.vector_store import get_vector_store
+from app.services.vector_store_qdrant import VectorStore
 import requests
 
 router = APIRouter()
@@ -20,15 +23,24 @@ def healthz():
     except Exception:
         db_ok = False
 
-    # Qdrant check (cloud or local)
+    # Vector store check (Qdrant cloud/local server, or the in-process index)
     qdrant_ok = False
+    vector_store = {"backend": settings.VECTOR_BACKEND}
     try:
-        qc = QdrantClient(url=settings.QDRANT_URL, api_key=settings.QDRANT_API_KEY, timeout=settings.QDRANT_TIMEOUT)
-        _ = qc.get_collections()
+        if settings.VECTOR_BACKEND == "local":
+            vector_store = get_vector_store().stats()
+        else:
+            _ = VectorStore.get_client().get_collections()
         qdrant_ok = True
     except Exception:
         qdrant_ok = False
 
+    # OCR cache statistics (persisted, so the same for every API/worker process)
+    try:
+        ocr_cache_stats = ocr_cache.stats()
+    except Exception as e:
+        ocr_cache_stats = {"error": str(e)}
+
     # LLM runtime check (Ollama only for now)
     llm_ok = True
     llm_detail = "ok"
@@ -53,5 +65,9 @@ def healthz():
         "ok": db_ok and qdrant_ok and llm_ok,
         "db": db_ok,
         "qdrant": qdrant_ok,
-        "llm": {"ok": llm_ok, "detail": llm_detail}
+        "vector_store": vector_store,
+        "llm": {"ok": llm_ok, "detail": llm_detail},
+        "ocr_cache": ocr_cache_stats,
+        "query_batcher": EmbeddingService.batcher_stats(),
+        "embedding_cache": EmbeddingService.cache_stats()
     }
\ No newline at end of file
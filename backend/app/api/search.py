@@ -1,25 +1,53 @@
+from datetime import datetime
+from typing import List, Literal, Optional
 from fastapi import APIRouter, HTTPException, Query, Body
+from app.core.config import settings
 from app.services.embeddings import EmbeddingService
+from app.services.vector_store import get_vector_store
 from app.services.vector_store_qdrant import VectorStore
 from app.services.ai_processor import AIProcessor # <-- Import AIProcessor
-from app.schemas.search import SearchResponse, SearchHit, RAGResponse # <-- Import RAGResponse
+from app.schemas.search import (
+    SearchResponse, SearchHit, SearchGroup, RAGResponse, SearchFilters,
+    BatchSearchRequest, BatchSearchResult, BatchSearchResponse,
+)
 
 router = APIRouter()
 
+
+def _query_filter(filters: SearchFilters | None):
+    if filters is None:
+        return None
+    return VectorStore.build_filter(
+        doc_ids=filters.doc_id,
+        langs=filters.lang,
+        classifications=filters.classification,
+        mime_types=filters.mime_type,
+        uploaded_from=filters.uploaded_from,
+        uploaded_to=filters.uploaded_to,
+    )
+
+
 # NEW RAG ENDPOINT
 @router.post("/search/rag", response_model=RAGResponse)
-def rag_search(query: str = Body(..., embed=True)):
+def rag_search(query: str = Body(..., embed=True), filters: Optional[SearchFilters] = Body(None)):
     try:
         # 1. Initialize services
         emb = EmbeddingService()
-        vs = VectorStore()
+        vs = get_vector_store()
         ai = AIProcessor()
 
         # 2. Embed the user's query
         query_vector = emb.embed_text(query)
 
-        # 3. Retrieve relevant chunks from the vector store
-        hits = vs.search(query_vector, k=5) # Retrieve top 5 chunks
+        # 3. Retrieve relevant chunks from the vector store: the best chunks of
+        #    several documents (round-robin by document rank), not top-k of one file
+        groups = vs.search_groups(
+            query_vector, query, groups=settings.RAG_MAX_DOCS, group_size=settings.RAG_CHUNKS_PER_DOC,
+            mode=settings.SEARCH_MODE, query_filter=_query_filter(filters), dedupe=True,
+        )
+        hits = [
+            g[rank] for rank in range(settings.RAG_CHUNKS_PER_DOC) for _, g in groups if rank < len(g)
+        ][: settings.RAG_MAX_CHUNKS]
         if not hits:
             return RAGResponse(answer="I couldn't find any relevant information in the documents.", sources=[])
 
@@ -48,14 +76,43 @@ def rag_search(query: str = Body(..., embed=True)):
 
 # EXISTING SEMANTIC SEARCH ENDPOINT
 @router.get("/search", response_model=SearchResponse)
-def search(query: str = Query(...), k: int = Query(10, ge=1, le=50)):
-    emb = EmbeddingService()
-    vs = VectorStore()
-    qvec = emb.embed_text(query)
-    hits = vs.search(qvec, k=k)
+def search(
+    query: str = Query(...),
+    k: int = Query(10, ge=1, le=50),
+    mode: Literal["dense", "sparse", "hybrid"] | None = Query(None, description="Defaults to SEARCH_MODE"),
+    doc_id: Optional[List[str]] = Query(None),
+    lang: Optional[List[str]] = Query(None),
+    classification: Optional[List[str]] = Query(None),
+    mime_type: Optional[List[str]] = Query(None),
+    uploaded_from: Optional[datetime] = Query(None),
+    uploaded_to: Optional[datetime] = Query(None),
+    group_by_doc: bool = Query(False, description="Return the best k documents with up to per_doc chunks each"),
+    per_doc: int = Query(settings.SEARCH_GROUP_SIZE, ge=1, le=10),
+    dedupe: bool = Query(settings.SEARCH_DEDUPE_OVERLAP, description="Grouped: drop chunks overlapping a better one's pages"),
+):
+    mode = mode or settings.SEARCH_MODE
+    query_filter = _query_filter(SearchFilters(
+        doc_id=doc_id, lang=lang, classification=classification, mime_type=mime_type,
+        uploaded_from=uploaded_from, uploaded_to=uploaded_to,
+    ))
+    vs = get_vector_store()
+    # Pure lexical search needs no embedding
+    qvec = EmbeddingService().embed_text(query) if mode != "sparse" or not vs.sparse else None
+    if group_by_doc:
+        groups = [
+            SearchGroup(doc_id=doc_id, hits=_to_hits(hits))
+            for doc_id, hits in vs.search_groups(
+                qvec, query, groups=k, group_size=per_doc, mode=mode, query_filter=query_filter, dedupe=dedupe,
+            )
+        ]
+        return SearchResponse(results=[h for g in groups for h in g.hits], groups=groups)
+    hits = vs.search(qvec, k=k, query_text=query, mode=mode, query_filter=query_filter)
     if hits is None:
         raise HTTPException(status_code=500, detail="Vector search failed")
+    return SearchResponse(results=_to_hits(hits))
+
 
+def _to_hits(hits) -> List[SearchHit]:
     results = []
     for h in hits:
         payload = h.payload or {}
@@ -70,4 +127,27 @@ def search(query: str = Query(...), k: int = Query(10, ge=1, le=50)):
             page_end=payload.get("page_end", 0),
             snippet=short
         ))
-    return SearchResponse(results=results)  
\ No newline at end of file
+    return results
+
+
+@router.post("/search/batch", response_model=BatchSearchResponse)
+def search_batch(req: BatchSearchRequest):
+    """
+    Many queries in one call: all queries are embedded in a single encode and
+    sent to Qdrant as one batch request; results come back per query, in order.
+    """
+    if not req.queries:
+        raise HTTPException(status_code=400, detail="No queries given")
+    if len(req.queries) > settings.SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {settings.SEARCH_BATCH_MAX_QUERIES} queries per batch")
+    mode = req.mode or settings.SEARCH_MODE
+    vs = get_vector_store()
+    qvecs = EmbeddingService().embed_queries(req.queries) if mode != "sparse" or not vs.sparse else None
+    try:
+        batches = vs.search_batch(qvecs, req.queries, k=req.k, mode=mode, query_filter=_query_filter(req.filters))
+    except Exception as e:
+        print(f"Error during batch search: {e}")
+        raise HTTPException(status_code=500, detail="Vector search failed")
+    return BatchSearchResponse(results=[
+        BatchSearchResult(query=q, results=_to_hits(hits)) for q, hits in zip(req.queries, batches)
+    ])
@@ -13,17 +13,115 @@ class Settings:
     # comment out gemini api key below when using ollama model (not necessary but harmless)
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "") 
 
+    # qdrant | local (in-process memory-mapped index under LOCAL_INDEX_DIR; for tests, benchmarks, small deployments)
+    VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "qdrant").lower()
+    LOCAL_INDEX_DIR: str = os.getenv("LOCAL_INDEX_DIR", os.path.join(os.getenv("STORAGE_DIR", os.path.abspath("./storage")), "vector_index"))
+    # Local index: exact search below LOCAL_HNSW_MIN_POINTS live points, an hnswlib graph above (if installed)
+    LOCAL_HNSW_MIN_POINTS: int = int(os.getenv("LOCAL_HNSW_MIN_POINTS", "20000"))
+    LOCAL_HNSW_M: int = int(os.getenv("LOCAL_HNSW_M", "16"))
+    LOCAL_HNSW_EF_CONSTRUCTION: int = int(os.getenv("LOCAL_HNSW_EF_CONSTRUCTION", "200"))
+    LOCAL_HNSW_EF: int = int(os.getenv("LOCAL_HNSW_EF", "128"))
+    LOCAL_HNSW_SAVE_EVERY: int = int(os.getenv("LOCAL_HNSW_SAVE_EVERY", "5000"))  # writes between graph snapshots
+
     # Vector store performance tunables
     QDRANT_TIMEOUT: float = float(os.getenv("QDRANT_TIMEOUT", "60"))  # seconds
     QDRANT_BATCH_SIZE: int = int(os.getenv("QDRANT_BATCH_SIZE", "64"))  # points per upsert batch
+    QDRANT_UPSERT_CONCURRENCY: int = int(os.getenv("QDRANT_UPSERT_CONCURRENCY", "4"))  # batches in flight
+    QDRANT_UPSERT_RETRIES: int = int(os.getenv("QDRANT_UPSERT_RETRIES", "3"))  # attempts per batch
+    # gRPC transport for upserts/searches (binary protobuf instead of JSON); port 6334 by default
+    QDRANT_PREFER_GRPC: bool = os.getenv("QDRANT_PREFER_GRPC", "false").lower() in ("1", "true", "yes")
+    QDRANT_GRPC_PORT: int = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+    # Collection storage: none | scalar (int8, ~4x smaller) | binary (1 bit, ~32x smaller); originals are kept for rescoring
+    QDRANT_QUANTIZATION: str = os.getenv("QDRANT_QUANTIZATION", "none").lower()
+    QDRANT_QUANTIZATION_ALWAYS_RAM: bool = os.getenv("QDRANT_QUANTIZATION_ALWAYS_RAM", "true").lower() in ("1", "true", "yes")
+    QDRANT_VECTORS_ON_DISK: bool = os.getenv("QDRANT_VECTORS_ON_DISK", "false").lower() in ("1", "true", "yes")
+    QDRANT_PAYLOAD_ON_DISK: bool = os.getenv("QDRANT_PAYLOAD_ON_DISK", "false").lower() in ("1", "true", "yes")
+    QDRANT_HNSW_M: int = int(os.getenv("QDRANT_HNSW_M", "16"))
+    QDRANT_HNSW_EF_CONSTRUCT: int = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+    QDRANT_HNSW_ON_DISK: bool = os.getenv("QDRANT_HNSW_ON_DISK", "false").lower() in ("1", "true", "yes")
+    # Search-time: HNSW ef (0 = server default), and with quantization, rescoring of oversampling * limit candidates
+    QDRANT_SEARCH_EF: int = int(os.getenv("QDRANT_SEARCH_EF", "0"))
+    QDRANT_SEARCH_RESCORE: bool = os.getenv("QDRANT_SEARCH_RESCORE", "true").lower() in ("1", "true", "yes")
+    QDRANT_SEARCH_OVERSAMPLING: float = float(os.getenv("QDRANT_SEARCH_OVERSAMPLING", "2.0"))
+    # Sparse BM25 vectors stored next to the dense vector (exact ids, invoice/PO numbers, tags)
+    SPARSE_VECTORS_ENABLED: bool = os.getenv("SPARSE_VECTORS_ENABLED", "true").lower() in ("1", "true", "yes")
+    BM25_K1: float = float(os.getenv("BM25_K1", "1.2"))
+    BM25_B: float = float(os.getenv("BM25_B", "0.75"))
+    BM25_AVG_DOC_TOKENS: int = int(os.getenv("BM25_AVG_DOC_TOKENS", "300"))
+    # Default /search mode: dense | sparse | hybrid (both, fused server-side with reciprocal-rank fusion)
+    SEARCH_MODE: str = os.getenv("SEARCH_MODE", "hybrid").lower()
+    HYBRID_PREFETCH_LIMIT: int = int(os.getenv("HYBRID_PREFETCH_LIMIT", "50"))  # candidates per retriever
+    # Grouped search: best N documents with up to SEARCH_GROUP_SIZE chunks each, overlapping page ranges dropped
+    SEARCH_GROUP_SIZE: int = int(os.getenv("SEARCH_GROUP_SIZE", "3"))
+    # Hybrid grouped search prefetches groups x chunks per group x this factor candidates per retriever
+    HYBRID_GROUP_PREFETCH_FACTOR: int = int(os.getenv("HYBRID_GROUP_PREFETCH_FACTOR", "4"))
+    SEARCH_DEDUPE_OVERLAP: bool = os.getenv("SEARCH_DEDUPE_OVERLAP", "true").lower() in ("1", "true", "yes")
+    # RAG context: up to RAG_CHUNKS_PER_DOC chunks from each of RAG_MAX_DOCS documents, RAG_MAX_CHUNKS in total
+    RAG_MAX_DOCS: int = int(os.getenv("RAG_MAX_DOCS", "5"))
+    RAG_CHUNKS_PER_DOC: int = int(os.getenv("RAG_CHUNKS_PER_DOC", "2"))
+    RAG_MAX_CHUNKS: int = int(os.getenv("RAG_MAX_CHUNKS", "5"))
+    SEARCH_BATCH_MAX_QUERIES: int = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", "64"))  # per POST /search/batch
 
     STORAGE_DIR: str = os.getenv("STORAGE_DIR", os.path.abspath("./storage"))
+    # Uploads are streamed to disk (and hashed) in blocks of this size instead of being read into memory
+    UPLOAD_BLOCK_BYTES: int = int(os.getenv("UPLOAD_BLOCK_BYTES", str(1024 * 1024)))
+    # With versioning, QDRANT_COLLECTION is an alias for the live "<name>__<hash of model/dim/chunking>" collection
     COLLECTION_NAME: str = os.getenv("QDRANT_COLLECTION", "trinetra_chunks")
+    COLLECTION_VERSIONING: bool = os.getenv("COLLECTION_VERSIONING", "true").lower() in ("1", "true", "yes")
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "intfloat/multilingual-e5-base")
-    CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", "2000"))
-    CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "200"))
+    EMBEDDING_DIM: int = int(os.getenv("EMBEDDING_DIM", "768"))  # vector size of EMBEDDING_MODEL
+    # torch (sentence-transformers) | onnx (ONNX Runtime, see scripts/export_onnx_embeddings.py)
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+    EMBEDDING_ONNX_DIR: str = os.getenv("EMBEDDING_ONNX_DIR", os.path.abspath("./models/multilingual-e5-base-onnx"))
+    EMBEDDING_ONNX_QUANTIZED: bool = os.getenv("EMBEDDING_ONNX_QUANTIZED", "true").lower() in ("1", "true", "yes")
+    EMBEDDING_THREADS: int = int(os.getenv("EMBEDDING_THREADS", "0"))  # 0 = runtime default
+    # PDF parsing/OCR: page ranges of large PDFs are spread over a process pool
+    PDF_PARSE_WORKERS: int = int(os.getenv("PDF_PARSE_WORKERS", str(os.cpu_count() or 1)))
+    PDF_PARALLEL_MIN_PAGES: int = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+    # OCR: render resolution adapts to page/region size; OCR_MODE=regions OCRs only image regions of mixed pages
+    OCR_MODE: str = os.getenv("OCR_MODE", "page").lower()  # page | regions
+    OCR_TARGET_PIXELS: int = int(os.getenv("OCR_TARGET_PIXELS", "2500"))  # long side of the rendered image
+    OCR_MIN_DPI: int = int(os.getenv("OCR_MIN_DPI", "150"))
+    OCR_MAX_DPI: int = int(os.getenv("OCR_MAX_DPI", "400"))
+    OCR_REGION_MIN_AREA: float = float(os.getenv("OCR_REGION_MIN_AREA", "5000"))  # pt^2, ~1 square inch
+    OCR_REGION_MAX_COVERAGE: float = float(os.getenv("OCR_REGION_MAX_COVERAGE", "0.6"))
+    # Persistent OCR cache (Postgres table ocr_cache), LRU-evicted beyond OCR_CACHE_MAX_BYTES
+    OCR_CACHE_ENABLED: bool = os.getenv("OCR_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    OCR_CACHE_MAX_BYTES: int = int(os.getenv("OCR_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+    OCR_CACHE_EVICT_EVERY: int = int(os.getenv("OCR_CACHE_EVICT_EVERY", "200"))  # stores between eviction sweeps
+    # Language detection results kept in memory, keyed by text hash
+    LANGDET_CACHE_SIZE: int = int(os.getenv("LANGDET_CACHE_SIZE", "10000"))
+    # Streaming ingest: pages are persisted, and chunks embedded/upserted, in bounded batches
+    INGEST_STREAMING: bool = os.getenv("INGEST_STREAMING", "false").lower() in ("1", "true", "yes")
+    INGEST_PAGE_BATCH: int = int(os.getenv("INGEST_PAGE_BATCH", "16"))
+    EMBED_BATCH_SIZE: int = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+    # Bulk embedding (backfills/re-index): length-bucketed batches, optional multi-process pool (torch backend)
+    EMBED_BULK_BATCH_SIZE: int = int(os.getenv("EMBED_BULK_BATCH_SIZE", "32"))
+    EMBED_BULK_PROCESSES: int = int(os.getenv("EMBED_BULK_PROCESSES", "1"))
+    EMBED_BULK_GROUP: int = int(os.getenv("EMBED_BULK_GROUP", "4096"))  # chunks per bulk encode call
+    # Query embeddings: concurrent requests are coalesced for up to QUERY_BATCH_MAX_WAIT_MS / QUERY_BATCH_MAX_SIZE
+    QUERY_BATCHING: bool = os.getenv("QUERY_BATCHING", "true").lower() in ("1", "true", "yes")
+    QUERY_BATCH_MAX_WAIT_MS: float = float(os.getenv("QUERY_BATCH_MAX_WAIT_MS", "5"))
+    QUERY_BATCH_MAX_SIZE: int = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+    # Persistent embedding cache keyed by (EMBEDDING_MODEL, normalized text hash); LRU beyond EMBED_CACHE_MAX_BYTES
+    EMBED_CACHE_ENABLED: bool = os.getenv("EMBED_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    EMBED_CACHE_DIR: str = os.getenv("EMBED_CACHE_DIR", os.path.join(os.getenv("STORAGE_DIR", os.path.abspath("./storage")), "embedding_cache"))
+    EMBED_CACHE_MAX_BYTES: int = int(os.getenv("EMBED_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+    # Chunk size in embedding-model tokens (capped at the model's input limit, 512 for e5) and overlap between chunks
+    CHUNK_MAX_TOKENS: int = int(os.getenv("CHUNK_MAX_TOKENS", "480"))
+    CHUNK_OVERLAP_TOKENS: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", "48"))
 
     # How much of the chunk text to store in Qdrant payload for preview/snippet
     TEXT_SNIPPET_CHARS: int = int(os.getenv("TEXT_SNIPPET_CHARS", "500"))
     VLM_MODEL_NAME: str = os.getenv("VLM_MODEL_NAME", "qwen2-vl:7b-q4_K_M")
+    OLLAMA_URL: str = os.getenv("OLLAMA_URL", "http://localhost:11434")
+
+    # Background ingestion (Celery)
+    CELERY_BROKER_URL: str = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+    # When true, POST /documents/upload queues work on the worker and returns 202 by default
+    INGEST_ASYNC: bool = os.getenv("INGEST_ASYNC", "false").lower() in ("1", "true", "yes")
+    # Celery retries per pipeline stage before the document is marked FAILED (resumes from its checkpoint)
+    PIPELINE_MAX_RETRIES: int = int(os.getenv("PIPELINE_MAX_RETRIES", "3"))
+    # Celery beat: remove Qdrant points of documents missing from Postgres every N minutes (0 = off)
+    VECTOR_GC_INTERVAL_MINUTES: float = float(os.getenv("VECTOR_GC_INTERVAL_MINUTES", "60"))
 settings = Settings()
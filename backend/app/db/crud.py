@@ -32,4 +32,35 @@ def save_caption_for_image(db: Session, storage_uri: str, caption: str, model_ve
 
 def get_images_for_doc(db: Session, doc_id: str) -> list[models.Image]:
     """Gets all image objects for a document, to be returned by the API."""
-    return db.query(models.Image).filter(models.Image.doc_id == doc_id).order_by(models.Image.page_number).all()
\ No newline at end of file
+    return db.query(models.Image).filter(models.Image.doc_id == doc_id).order_by(models.Image.page_number).all()
+
+# --- Document status Functions ---
+
+def set_document_status(db: Session, doc_id: str, status: str, stage: str | None = None, error: str | None = None):
+    """Records the ingestion status (and current pipeline stage) of a document."""
+    db.query(models.Document).filter(models.Document.id == doc_id).update({
+        "status": status,
+        "stage": stage,
+        "error": error,
+    })
+    db.commit()
+
+
+# --- Pipeline checkpoint Functions ---
+
+def get_checkpoints(db: Session, doc_id: str) -> list[str]:
+    """Returns the pipeline stages a document has already finished."""
+    done = db.query(models.Document.checkpoints).filter(models.Document.id == doc_id).scalar()
+    return list(done or [])
+
+def add_checkpoint(db: Session, doc_id: str, checkpoint: str):
+    """Records that a pipeline stage finished for a document."""
+    done = get_checkpoints(db, doc_id)
+    if checkpoint not in done:
+        done.append(checkpoint)
+        db.query(models.Document).filter(models.Document.id == doc_id).update({"checkpoints": done})
+        db.commit()
+
+def clear_checkpoints(db: Session, doc_id: str):
+    db.query(models.Document).filter(models.Document.id == doc_id).update({"checkpoints": []})
+    db.commit()
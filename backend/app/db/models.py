@@ -1,6 +1,6 @@
 from sqlalchemy.orm import relationship
 from sqlalchemy import (
-    Column, String, Boolean, Integer, DateTime, ForeignKey, JSON, Float, Text
+    Column, String, Boolean, Integer, BigInteger, DateTime, ForeignKey, JSON, Float, Text
 )
 from datetime import datetime
 from uuid import uuid4
@@ -9,23 +9,37 @@ from app.db.database import Base
 def _id():
     return str(uuid4())
 
+# Document.status values
+STATUS_QUEUED = "QUEUED"
+STATUS_PROCESSING = "PROCESSING"
+STATUS_COMPLETED = "COMPLETED"
+STATUS_FAILED = "FAILED"
+
 class Document(Base):
     __tablename__ = "documents"
     id = Column(String, primary_key=True, default=_id, index=True)
     filename = Column(String, nullable=False)
     mime_type = Column(String, nullable=True)
     storage_uri = Column(String, nullable=False)
+    # SHA-256 of the uploaded bytes; files are stored by this hash and exact re-uploads reuse the document
+    content_sha256 = Column(String, nullable=True, index=True)
     language_primary = Column(String, nullable=True)
     ocr_applied = Column(Boolean, default=False)
     page_count = Column(Integer, default=0)
     
     # This is the new line that was added
-    status = Column(String, nullable=False, default="COMPLETED") 
+    status = Column(String, nullable=False, default=STATUS_COMPLETED) 
+    # Pipeline stage currently running (or last reached) for queued/background ingestion
+    stage = Column(String, nullable=True)
+    # Pipeline stages already finished (e.g. ["parsed", "indexed"]); retries resume after them
+    checkpoints = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
     
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     pages = relationship("Page", backref="document", cascade="all, delete-orphan")
     ai_outputs = relationship("AIOutput", backref="document", cascade="all, delete-orphan")
+    images = relationship("Image", backref="document", cascade="all, delete-orphan")
 
 
 class Page(Base):
@@ -48,4 +62,31 @@ class AIOutput(Base):
     classification_confidence = Column(Float, default=0.0)
     extraction = Column(JSON, nullable=True)
     model_version = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class Image(Base):
+    __tablename__ = "images"
+    id = Column(String, primary_key=True, default=_id)
+    doc_id = Column(String, ForeignKey("documents.id", ondelete="CASCADE"), index=True, nullable=False)
+    page_number = Column(Integer, nullable=False)
+    storage_uri = Column(String, nullable=False)
+    caption = Column(Text, nullable=True)
+    caption_model_version = Column(String, nullable=True)
+
+
+class OCRCacheEntry(Base):
+    """Tesseract output keyed by hash of the rendered image + language pack + DPI."""
+    __tablename__ = "ocr_cache"
+    key = Column(String, primary_key=True)
+    text = Column(Text, nullable=False, default="")
+    size_bytes = Column(Integer, nullable=False, default=0)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_used_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class OCRCacheCounter(Base):
+    """Cache events that leave no row behind (misses, evictions), shared by all processes."""
+    __tablename__ = "ocr_cache_counters"
+    name = Column(String, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
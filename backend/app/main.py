@@ -5,7 +5,7 @@ from app.api.health import router as health_router
 from app.api.documents import router as documents_router
 from app.api.search import router as search_router
 from app.db.database import init_db
-from app.services.vector_store_qdrant import VectorStore
+from app.services.vector_store import get_vector_store
 
 app = FastAPI(title="Project Trinetra API", version="0.1.0")
 
@@ -24,5 +24,6 @@ app.include_router(search_router, tags=["search"])
 @app.on_event("startup")
 def on_startup():
     init_db()
-    # Ensure Qdrant collection + payload index exist
-    VectorStore()  # constructor ensures indexes
\ No newline at end of file
+    # Ensure the Qdrant collection + payload indexes exist, or open the local index
+    # (once per process; later get_vector_store() calls reuse the client / index)
+    get_vector_store()
\ No newline at end of file
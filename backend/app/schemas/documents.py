@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import List, Optional, Any
+from datetime import datetime
 
 class UploadResponse(BaseModel):
     doc_id: str
@@ -7,11 +8,36 @@ class UploadResponse(BaseModel):
     page_count: int
     ocr_applied: bool
     language_primary: Optional[str] = None
+    status: Optional[str] = None
+    # True when the same bytes were already ingested and doc_id points at that document
+    duplicate: bool = False
     error: Optional[str] = None
 
 class UploadManyResponse(BaseModel):
     results: List[UploadResponse]
 
+class DocumentStatusResponse(BaseModel):
+    doc_id: str
+    status: str
+    stage: Optional[str] = None
+    checkpoints: List[str] = []
+    page_count: int
+    error: Optional[str] = None
+
+class BulkDeleteRequest(BaseModel):
+    """Documents to delete: explicit ids and/or document-level filters (all given criteria must match)."""
+    doc_ids: Optional[List[str]] = None
+    classification: Optional[List[str]] = None
+    mime_type: Optional[List[str]] = None
+    uploaded_from: Optional[datetime] = None
+    uploaded_to: Optional[datetime] = None
+
+class BulkDeleteResponse(BaseModel):
+    deleted: int
+    doc_ids: List[str]
+    # False when the vector cleanup failed; the orphan reconciler removes those points later
+    vectors_deleted: bool
+
 class PageInfo(BaseModel):
     page_number: int
     has_images: bool
@@ -1,5 +1,15 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from datetime import datetime
+
+class SearchFilters(BaseModel):
+    """Restricts retrieval to chunks whose indexed payload matches; each list matches any of its values."""
+    doc_id: Optional[List[str]] = None
+    lang: Optional[List[str]] = None
+    classification: Optional[List[str]] = None
+    mime_type: Optional[List[str]] = None
+    uploaded_from: Optional[datetime] = None
+    uploaded_to: Optional[datetime] = None
 
 class SearchHit(BaseModel):
     doc_id: str
@@ -9,8 +19,26 @@ class SearchHit(BaseModel):
     page_end: int
     snippet: str
 
+class SearchGroup(BaseModel):
+    doc_id: str
+    hits: List[SearchHit]
+
 class SearchResponse(BaseModel):
     results: List[SearchHit]
+    groups: Optional[List[SearchGroup]] = None  # set for grouped (per-document) searches
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    k: int = Field(10, ge=1, le=50)
+    mode: Optional[Literal["dense", "sparse", "hybrid"]] = None  # defaults to SEARCH_MODE
+    filters: Optional[SearchFilters] = None  # applied to every query
+
+class BatchSearchResult(BaseModel):
+    query: str
+    results: List[SearchHit]
+
+class BatchSearchResponse(BaseModel):
+    results: List[BatchSearchResult]
 
 # ADD THIS NEW CLASS
 class RAGResponse(BaseModel):
@@ -1,10 +1,29 @@
-from typing import List
+import bisect
+import hashlib
+import re
+import threading
+from collections import Counter
+from typing import Iterable, Iterator, List
 from dataclasses import dataclass
-from uuid import uuid4
+from uuid import uuid5, NAMESPACE_URL
 from app.core.config import settings
 from app.services.parsing_service import ParsedPage
 
-@dataclass
+# Bump when chunk boundaries change; with the tokenizer mode (chunker_version()) it is part of the
+# versioned collection name
+CHUNKER_VERSION = "tokens-v1"
+
+# Sentence ends (Latin and Indic punctuation, optionally closed by quotes/brackets) and paragraph breaks
+_SENTENCE_END = re.compile(r"[.!?।॥]+[\"'”’)\]]*\s+|\n\s*\n")
+# Fallback token estimate when the embedding tokenizer is unavailable: one token per 3 non-space
+# characters, which over-counts (never truncates) for both English and Malayalam subwords
+_PSEUDO_TOKEN = re.compile(r"\S{1,3}")
+
+_tokenizer = None
+_tokenizer_loaded = False
+_tokenizer_lock = threading.Lock()
+
+@dataclass(slots=True)
 class Chunk:
     chunk_id: str
     doc_id: str
@@ -16,39 +35,166 @@ class Chunk:
     text: str
 
 def chunk_pages(pages: List[ParsedPage], doc_id: str) -> List[Chunk]:
+    return list(iter_chunks(pages, doc_id))
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    """Groups an iterable into lists of at most `size` items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _get_tokenizer():
+    """The embedding model's (fast) tokenizer, loaded once per process; None if unavailable."""
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        with _tokenizer_lock:
+            if not _tokenizer_loaded:
+                try:
+                    from transformers import AutoTokenizer
+                    src = settings.EMBEDDING_ONNX_DIR if settings.EMBEDDING_BACKEND == "onnx" else settings.EMBEDDING_MODEL
+                    tok = AutoTokenizer.from_pretrained(src)
+                    if not tok.is_fast:
+                        raise ValueError("no offset mapping (slow tokenizer)")
+                    _tokenizer = tok
+                except Exception as e:
+                    print(
+                        f"Could not load the {settings.EMBEDDING_MODEL} tokenizer ({e}); estimating chunk sizes from "
+                        f"characters, which gives different chunks and a different versioned collection"
+                    )
+                _tokenizer_loaded = True
+    return _tokenizer
+
+def chunker_version() -> str:
     """
-    Produce fixed-size (approx by characters) chunks per page with overlap.
-    Overlap is applied only within a page boundary for simplicity (MVP).
-    Provenance: page_start == page_end for each produced chunk (page granularity).
+    CHUNKER_VERSION, suffixed with "+estimate" when chunk sizes come from the
+    character estimate because the tokenizer could not be loaded. The two
+    modes cut different chunks (and chunk ids), and the versioned collection
+    name includes this so they are never mixed in one collection.
     """
-    max_size = settings.CHUNK_SIZE
-    overlap = settings.CHUNK_OVERLAP
-    chunks: List[Chunk] = []
+    return CHUNKER_VERSION if _get_tokenizer() is not None else f"{CHUNKER_VERSION}+estimate"
 
-    for page in pages:
-        raw_text = (page.text_ocr or page.text_raw or "").strip()
-        if not raw_text:
+def _max_tokens() -> int:
+    tok = _get_tokenizer()
+    limit = settings.CHUNK_MAX_TOKENS
+    model_max = getattr(tok, "model_max_length", None) if tok is not None else None
+    if model_max and model_max < 100_000:
+        limit = min(limit, model_max - 2)  # room for <s> and </s>
+    return max(limit, 1)
+
+def _token_starts(text: str) -> List[int]:
+    """Start offset of every token of `text`, as the embedding model would tokenize it."""
+    tok = _get_tokenizer()
+    if tok is None:
+        return [m.start() for m in _PSEUDO_TOKEN.finditer(text)]
+    enc = tok(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+    return [s for s, e in enc["offset_mapping"] if e > s]
+
+@dataclass(slots=True)
+class _Unit:
+    """A sentence (or a token-bounded piece of an over-long one) of one page."""
+    page: int
+    start: int
+    end: int
+    tokens: int
+    lang: str | None
+    text: str
+    gap: str  # separator placed before it when it follows a unit of the same page
+
+def _sentence_spans(text: str) -> Iterator[tuple[int, int]]:
+    start = 0
+    for m in _SENTENCE_END.finditer(text):
+        yield start, m.end()
+        start = m.end()
+    yield start, len(text)
+
+def _page_units(page: ParsedPage, max_tokens: int) -> Iterator[_Unit]:
+    text = page.text_ocr or page.text_raw or ""
+    if not text.strip():
+        return
+    starts = _token_starts(text)
+    prev_end = 0
+    for s, e in _sentence_spans(text):
+        # Trim surrounding whitespace so offsets point at the sentence itself
+        while s < e and text[s].isspace():
+            s += 1
+        while e > s and text[e - 1].isspace():
+            e -= 1
+        if s >= e:
             continue
-        start_idx = 0
-        page_len = len(raw_text)
-        while start_idx < page_len:
-            end_idx = min(start_idx + max_size, page_len)
-            segment = raw_text[start_idx:end_idx]
-            chunk_id = str(uuid4())
-            chunks.append(
-                Chunk(
-                    chunk_id=chunk_id,
-                    doc_id=doc_id,
-                    page_start=page.page_number,
-                    page_end=page.page_number,
-                    char_start=start_idx,
-                    char_end=end_idx,
-                    lang=page.lang_detected,
-                    text=segment
-                )
-            )
-            if end_idx == page_len:
-                break
-            # Move forward with overlap
-            start_idx = end_idx - overlap if end_idx - overlap > start_idx else end_idx
-    return chunks
\ No newline at end of file
+        first, last = bisect.bisect_left(starts, s), bisect.bisect_left(starts, e)
+        # Over-long sentences are cut at token boundaries into pieces of at most max_tokens
+        for i in range(first, max(last, first + 1), max_tokens):
+            piece_start = s if i == first else starts[i]
+            piece_end = e if i + max_tokens >= last else starts[i + max_tokens]
+            piece = text[piece_start:piece_end].rstrip()
+            gap = "\n" if "\n" in text[prev_end:piece_start] else " "
+            yield _Unit(page.page_number, piece_start, piece_start + len(piece),
+                        max(min(last, i + max_tokens) - i, 1), page.lang_detected, piece, gap)
+            prev_end = piece_start + len(piece)
+
+def _make_chunk(doc_id: str, units: List[_Unit], seen: Counter) -> Chunk:
+    parts = [units[0].text]
+    for prev, u in zip(units, units[1:]):
+        parts.append((u.gap if u.page == prev.page else "\n") + u.text)
+    text = "".join(parts)
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    # Repeated text within a document (boilerplate pages) still gets distinct ids, numbered by occurrence
+    key = f"{doc_id}:{digest}" if not seen[digest] else f"{doc_id}:{digest}:{seen[digest]}"
+    seen[digest] += 1
+    langs = Counter()
+    for u in units:
+        langs[u.lang] += u.tokens
+    return Chunk(
+        chunk_id=str(uuid5(NAMESPACE_URL, key)),
+        doc_id=doc_id,
+        page_start=units[0].page,
+        page_end=units[-1].page,
+        char_start=units[0].start,
+        char_end=units[-1].end,
+        lang=langs.most_common(1)[0][0],
+        text=text,
+    )
+
+def iter_chunks(pages: Iterable[ParsedPage], doc_id: str) -> Iterator[Chunk]:
+    """
+    Packs whole sentences into chunks of at most CHUNK_MAX_TOKENS tokens, as
+    counted by the embedding model's tokenizer (capped at its maximum input
+    length, so nothing is silently truncated at embedding time). Chunks run
+    across page boundaries; consecutive chunks share up to
+    CHUNK_OVERLAP_TOKENS tokens of trailing sentences. Sentences longer than
+    the limit are cut at token boundaries.
+
+    Provenance: page_start/page_end are the first and last pages a chunk
+    draws from; char_start is an offset into page_start's text and char_end
+    into page_end's. The chunk id (and point id) is derived from
+    (doc_id, content hash), so re-chunking unchanged text yields the same ids.
+    Pages are consumed lazily; only the sentences of the current chunk are held.
+    """
+    max_tokens = _max_tokens()
+    overlap = min(settings.CHUNK_OVERLAP_TOKENS, max_tokens // 2)
+    seen: Counter = Counter()
+    buf: List[_Unit] = []
+    buf_tokens = 0
+    for page in pages:
+        for unit in _page_units(page, max_tokens):
+            if buf and buf_tokens + unit.tokens > max_tokens:
+                yield _make_chunk(doc_id, buf, seen)
+                # Carry trailing sentences into the next chunk as overlap (never the whole chunk)
+                keep, kept_tokens = [], 0
+                for u in reversed(buf[1:]):
+                    if kept_tokens + u.tokens > overlap:
+                        break
+                    keep.append(u)
+                    kept_tokens += u.tokens
+                buf, buf_tokens = keep[::-1], kept_tokens
+                while buf and buf_tokens + unit.tokens > max_tokens:
+                    buf_tokens -= buf.pop(0).tokens
+            buf.append(unit)
+            buf_tokens += unit.tokens
+    if buf:
+        yield _make_chunk(doc_id, buf, seen)
@@ -0,0 +1,82 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List
+import numpy as np
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent single-text embedding requests into one encode call.
+    Callers block in submit(); a background thread waits up to `max_wait_s`
+    after the first queued request (or until `max_batch` requests are queued),
+    encodes them together and hands each caller its own row.
+    """
+
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], max_batch: int, max_wait_s: float):
+        self._encode = encode
+        self._max_batch = max(1, max_batch)
+        self._max_wait_s = max(0.0, max_wait_s)
+        self._queue: "queue.Queue[tuple[str, float, Future]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "batches": 0,
+            "max_batch_size": 0,
+            "batch_sizes": {},
+            "queue_wait_ms_total": 0.0,
+            "queue_wait_ms_max": 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> np.ndarray:
+        fut: Future = Future()
+        self._queue.put((text, time.perf_counter(), fut))
+        return fut.result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            s["batch_sizes"] = dict(self._stats["batch_sizes"])
+        s["avg_batch_size"] = round(s["requests"] / s["batches"], 2) if s["batches"] else 0.0
+        s["avg_queue_wait_ms"] = round(s.pop("queue_wait_ms_total") / s["requests"], 3) if s["requests"] else 0.0
+        s["queue_wait_ms_max"] = round(s["queue_wait_ms_max"], 3)
+        return s
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self._max_wait_s
+        while len(batch) < self._max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _record(self, batch: list, started: float):
+        waits = [(started - enqueued) * 1000.0 for _, enqueued, _ in batch]
+        with self._lock:
+            st = self._stats
+            st["requests"] += len(batch)
+            st["batches"] += 1
+            st["max_batch_size"] = max(st["max_batch_size"], len(batch))
+            st["batch_sizes"][len(batch)] = st["batch_sizes"].get(len(batch), 0) + 1
+            st["queue_wait_ms_total"] += sum(waits)
+            st["queue_wait_ms_max"] = max(st["queue_wait_ms_max"], max(waits))
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            self._record(batch, started)
+            try:
+                mat = self._encode([text for text, _, _ in batch])
+            except Exception as e:
+                for _, _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for i, (_, _, fut) in enumerate(batch):
+                fut.set_result(mat[i])
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import List, Tuple
+import numpy as np
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+KEY_BYTES = 16
+# Access times are buffered per process and written (with an msync of the vectors) at most this often
+TOUCH_FLUSH_SECONDS = 30.0
+
+
+class EmbeddingCache:
+    """
+    Disk-backed embedding store shared by every process on the host.
+
+    Vectors live in a fixed-capacity, memory-mapped float32 matrix
+    (vectors.f32); a small SQLite table maps a key to its row (slot) and
+    last-use time. The key is a hash of (model name, whitespace-normalized
+    text), so a cached vector is only ever reused for the same model. When
+    the matrix is full, the least-recently-used slots are recycled.
+
+    Each slot's key is also kept next to the vectors (keys.bin). Writers
+    clear it, write the vector, then set it; readers accept a row only if
+    the key matches before and after copying it, so a slot recycled by
+    another process mid-read is treated as a miss instead of returning
+    another text's vector. Lookups take no SQLite write lock: last-use
+    times are buffered and written every TOUCH_FLUSH_SECONDS.
+    """
+
+    def __init__(self, root: str, model_name: str, dim: int, max_bytes: int):
+        self.model_name = model_name
+        self.dim = dim
+        self.capacity = max(1, max_bytes // (dim * 4))
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.dir = os.path.join(root, f"{slug}_{dim}")
+        os.makedirs(self.dir, exist_ok=True)
+
+        self._vectors = self._open_map("vectors.f32", np.float32, dim)
+        self._keys = self._open_map("keys.bin", np.uint8, KEY_BYTES)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.dir, "index.sqlite"), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, slot INTEGER UNIQUE NOT NULL, last_used REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        # Capacity may have shrunk since the cache was created
+        self._db.execute("DELETE FROM entries WHERE slot >= ?", (self.capacity,))
+        self._db.commit()
+        self._touched: dict[bytes, float] = {}
+        self._last_flush = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+
+    def _open_map(self, name: str, dtype, width: int) -> np.memmap:
+        path = os.path.join(self.dir, name)
+        size = self.capacity * width * np.dtype(dtype).itemsize
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)  # sparse on Linux; pages are allocated as rows are written
+        return np.memmap(path, dtype=dtype, mode="r+", shape=(self.capacity, width))
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{_normalize(text)}".encode("utf-8")).digest()[:KEY_BYTES]
+
+    def _read(self, slot: int, key: bytes, out: np.ndarray) -> bool:
+        if self._keys[slot].tobytes() != key:
+            return False
+        out[:] = self._vectors[slot]
+        return self._keys[slot].tobytes() == key
+
+    def _write(self, slot: int, key: bytes, vec):
+        self._keys[slot] = 0
+        self._vectors[slot] = vec
+        self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+
+    def _flush_touched(self, force: bool = False):
+        """Writes buffered last-use times and syncs the maps; call with self._lock held."""
+        if not self._touched or (not force and time.monotonic() - self._last_flush < TOUCH_FLUSH_SECONDS):
+            return
+        touched, self._touched = self._touched, {}
+        self._last_flush = time.monotonic()
+        self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(t, k) for k, t in touched.items()])
+        self._db.commit()
+        self._vectors.flush()
+        self._keys.flush()
+
+    def get_many(self, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """
+        Returns (matrix, missing): rows of `matrix` are filled for cached
+        texts; `missing` lists the indexes that still need encoding.
+        """
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        keys = [self.key(t) for t in texts]
+        missing = []
+        with self._lock:
+            slots = {}
+            for i in range(0, len(keys), 500):
+                part = list(set(keys[i:i + 500]))
+                marks = ",".join("?" * len(part))
+                for k, slot in self._db.execute(f"SELECT key, slot FROM entries WHERE key IN ({marks})", part):
+                    slots[bytes(k)] = slot
+            now = time.time()
+            for i, k in enumerate(keys):
+                slot = slots.get(k)
+                if slot is not None and self._read(slot, k, out[i]):
+                    self._touched[k] = now
+                else:
+                    missing.append(i)
+            self._flush_touched()
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return out, missing
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        if not len(texts):
+            return
+        now = time.time()
+        with self._lock:
+            cur = self._db.cursor()
+            cur.execute("BEGIN IMMEDIATE")  # serialises slot allocation across processes
+            try:
+                used = cur.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                for text, vec in zip(texts, vectors):
+                    k = self.key(text)
+                    row = cur.execute("SELECT slot FROM entries WHERE key = ?", (k,)).fetchone()
+                    if row is None:
+                        slot = self._free_slot(cur, used)
+                        used = min(used + 1, self.capacity)
+                        self._write(slot, k, vec)
+                        cur.execute("INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)", (k, slot, now))
+                    else:
+                        if self._keys[row[0]].tobytes() != k:
+                            # Written by an older cache without keys.bin (or torn by a crash)
+                            self._write(row[0], k, vec)
+                        cur.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, k))
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+            self._flush_touched()
+
+    def _free_slot(self, cur, used: int) -> int:
+        if used < self.capacity:
+            # Slots are handed out densely (recycled slots are reused at once), so the next one is `used`
+            return used
+        # Full: recycle the least-recently-used slot
+        key, slot = cur.execute("SELECT key, slot FROM entries ORDER BY last_used ASC LIMIT 1").fetchone()
+        cur.execute("DELETE FROM entries WHERE key = ?", (key,))
+        return slot
+
+    def stats(self) -> dict:
+        with self._lock:
+            used = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {"entries": used, "capacity": self.capacity, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,57 @@
+import os
+import numpy as np
+from typing import List
+
+ONNX_FP32_FILE = "model.onnx"
+ONNX_INT8_FILE = "model.int8.onnx"
+
+
+class OnnxSentenceEncoder:
+    """
+    ONNX Runtime stand-in for the subset of SentenceTransformer that
+    EmbeddingService uses (encode / get_sentence_embedding_dimension).
+
+    Expects a directory produced by scripts/export_onnx_embeddings.py: the
+    Hugging Face tokenizer files plus model.onnx and/or model.int8.onnx
+    (dynamic int8 quantization). Pooling matches the e5 sentence-transformers
+    config: attention-masked mean over the last hidden state.
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = True, threads: int = 0, max_seq_length: int = 512):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        path = os.path.join(model_dir, ONNX_INT8_FILE if quantized else ONNX_FP32_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"ONNX embedding model not found at {path}; run scripts/export_onnx_embeddings.py first")
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            opts.intra_op_num_threads = threads
+            opts.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_seq_length = max_seq_length
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self._dim = self.session.get_outputs()[0].shape[-1]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self._dim)
+
+    def encode(self, texts: List[str], batch_size: int = 32, normalize_embeddings: bool = True, **_) -> np.ndarray:
+        out = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            enc = self.tokenizer(
+                batch, padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors="np",
+            )
+            feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self._input_names}
+            hidden = self.session.run(None, feeds)[0]
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize_embeddings:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            out[start:start + len(batch)] = pooled
+        return out
@@ -1,19 +1,209 @@
-from sentence_transformers import SentenceTransformer
+import threading
+import time
+from contextlib import contextmanager
 import numpy as np
 from app.core.config import settings
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_cache import EmbeddingCache
 
 class EmbeddingService:
     _model = None
+    _batcher = None
+    _batcher_lock = threading.Lock()
+    _cache = None
+    _cache_lock = threading.Lock()
 
     def __init__(self):
         if EmbeddingService._model is None:
-            EmbeddingService._model = SentenceTransformer(settings.EMBEDDING_MODEL, device="cpu")
+            EmbeddingService._model = EmbeddingService._load_model()
+
+    @staticmethod
+    def _load_model():
+        """
+        EMBEDDING_BACKEND=torch: sentence-transformers on PyTorch (default).
+        EMBEDDING_BACKEND=onnx: exported model under EMBEDDING_ONNX_DIR on ONNX
+        Runtime, optionally int8-quantized; same encode() contract.
+        """
+        if settings.EMBEDDING_BACKEND == "onnx":
+            from app.services.embedding_onnx import OnnxSentenceEncoder
+            return OnnxSentenceEncoder(
+                settings.EMBEDDING_ONNX_DIR,
+                quantized=settings.EMBEDDING_ONNX_QUANTIZED,
+                threads=settings.EMBEDDING_THREADS,
+            )
+        from sentence_transformers import SentenceTransformer
+        if settings.EMBEDDING_THREADS > 0:
+            import torch
+            torch.set_num_threads(settings.EMBEDDING_THREADS)
+        return SentenceTransformer(settings.EMBEDDING_MODEL, device="cpu")
+
+    @staticmethod
+    def model_id() -> str:
+        """Identifies the exact vectors produced (backend/quantization included), e.g. for cache keys."""
+        if settings.EMBEDDING_BACKEND == "onnx":
+            return f"{settings.EMBEDDING_MODEL}@onnx-{'int8' if settings.EMBEDDING_ONNX_QUANTIZED else 'fp32'}"
+        return settings.EMBEDDING_MODEL
+
+    @classmethod
+    def batcher(cls) -> EmbeddingBatcher:
+        """Process-wide micro-batcher shared by all concurrent query embeddings."""
+        if cls._batcher is None:
+            with cls._batcher_lock:
+                if cls._batcher is None:
+                    cls._batcher = EmbeddingBatcher(
+                        cls._encode_texts,
+                        max_batch=settings.QUERY_BATCH_MAX_SIZE,
+                        max_wait_s=settings.QUERY_BATCH_MAX_WAIT_MS / 1000.0,
+                    )
+        return cls._batcher
+
+    @classmethod
+    def batcher_stats(cls) -> dict:
+        return cls._batcher.stats() if cls._batcher is not None else {}
+
+    @classmethod
+    def cache(cls) -> EmbeddingCache | None:
+        """Persistent (model, text-hash) -> vector store, or None when disabled."""
+        if not settings.EMBED_CACHE_ENABLED:
+            return None
+        if cls._cache is None:
+            with cls._cache_lock:
+                if cls._cache is None:
+                    cls._cache = EmbeddingCache(
+                        settings.EMBED_CACHE_DIR,
+                        cls.model_id(),
+                        cls._model.get_sentence_embedding_dimension(),
+                        settings.EMBED_CACHE_MAX_BYTES,
+                    )
+        return cls._cache
+
+    @classmethod
+    def cache_stats(cls) -> dict:
+        return cls._cache.stats() if cls._cache is not None else {}
+
+    def _embed_cached(self, texts, encode) -> np.ndarray:
+        """Serves texts from the embedding cache and encodes (then stores) only the misses."""
+        cache = EmbeddingService.cache()
+        if cache is None:
+            return encode(texts)
+        try:
+            out, missing = cache.get_many(texts)
+        except Exception as e:
+            print(f"Embedding cache lookup failed: {e}")
+            return encode(texts)
+        if missing:
+            miss_texts = [texts[i] for i in missing]
+            fresh = encode(miss_texts)
+            out[missing] = fresh
+            try:
+                cache.put_many(miss_texts, fresh)
+            except Exception as e:
+                print(f"Embedding cache store failed: {e}")
+        return out
+
+    @staticmethod
+    def _encode_texts(texts) -> np.ndarray:
+        mat = EmbeddingService._model.encode(list(texts), normalize_embeddings=True, convert_to_numpy=True)
+        return np.ascontiguousarray(mat, dtype=np.float32)
+
+    @staticmethod
+    def _encode_bucketed(texts, batch_size: int, pool: dict | None = None) -> np.ndarray:
+        """
+        Encodes texts sorted by length so each padded batch holds similarly
+        sized inputs, then restores the original order. With a `pool` (see
+        bulk_pool) the sorted batches are spread over its worker processes.
+        """
+        texts = list(texts)
+        order = np.argsort([len(t) for t in texts], kind="stable")
+        sorted_texts = [texts[i] for i in order]
+        if pool is not None:
+            workers = len(pool["processes"])
+            mat = EmbeddingService._model.encode_multi_process(
+                sorted_texts, pool, batch_size=batch_size, normalize_embeddings=True,
+                chunk_size=max(batch_size, len(sorted_texts) // (workers * 4) or 1),
+            )
+        else:
+            mat = np.concatenate([
+                EmbeddingService._encode_texts(sorted_texts[i:i + batch_size])
+                for i in range(0, len(sorted_texts), batch_size)
+            ]) if sorted_texts else EmbeddingService._encode_texts([])
+        out = np.empty_like(np.asarray(mat, dtype=np.float32))
+        out[order] = mat
+        return out
+
+    @contextmanager
+    def bulk_pool(self, processes: int | None = None):
+        """
+        sentence-transformers multi-process pool for embed_bulk (PyTorch
+        backend). Every worker loads the model, so start it once per backfill
+        run and pass it to each embed_bulk call. Yields None for processes <= 1.
+        """
+        processes = settings.EMBED_BULK_PROCESSES if processes is None else processes
+        if processes <= 1 or settings.EMBEDDING_BACKEND != "torch":
+            yield None
+            return
+        pool = EmbeddingService._model.start_multi_process_pool(["cpu"] * processes)
+        try:
+            yield pool
+        finally:
+            EmbeddingService._model.stop_multi_process_pool(pool)
+
+    def embed_bulk(self, texts, processes: int | None = None, pool: dict | None = None) -> np.ndarray:
+        """
+        Backfill/re-index path: length-bucketed, optionally multi-process
+        encoding of many texts (cache hits are skipped). Uses `pool` when
+        given; otherwise a pool of `processes` workers lives for this call
+        only. Prints throughput.
+        """
+        texts = list(texts)
+        if not texts:
+            dim = EmbeddingService._model.get_sentence_embedding_dimension()
+            return np.empty((0, dim), dtype=np.float32)
+        if pool is None:
+            with self.bulk_pool(processes) as own_pool:
+                if own_pool is not None:
+                    return self.embed_bulk(texts, pool=own_pool)
+        t0 = time.perf_counter()
+        mat = self._embed_cached(
+            texts, lambda t: EmbeddingService._encode_bucketed(t, settings.EMBED_BULK_BATCH_SIZE, pool)
+        )
+        dt = max(time.perf_counter() - t0, 1e-9)
+        workers = len(pool["processes"]) if pool is not None else 1
+        print(f"Embedded {len(texts)} chunks in {dt:.1f}s ({len(texts) / dt:.1f} chunks/s, processes={workers})")
+        return mat
 
     def embed_text(self, text: str) -> np.ndarray:
-        vec = EmbeddingService._model.encode([text], normalize_embeddings=True)
-        return vec[0].astype(np.float32)
+        """
+        Embeds one query (served from the embedding cache when possible). With
+        QUERY_BATCHING enabled, concurrent calls (e.g. parallel /search
+        requests) are coalesced into a single encode.
+        """
+        def encode(texts):
+            if settings.QUERY_BATCHING:
+                return EmbeddingService.batcher().submit(texts[0])[None, :]
+            return EmbeddingService._encode_texts(texts)
+        return self._embed_cached([text], encode)[0]
+
+    def embed_queries(self, texts) -> np.ndarray:
+        """
+        Embeds many queries at once (e.g. POST /search/batch): cache misses
+        are encoded in a single call, bypassing the per-query micro-batcher.
+        """
+        texts = list(texts)
+        if not texts:
+            dim = EmbeddingService._model.get_sentence_embedding_dimension()
+            return np.empty((0, dim), dtype=np.float32)
+        return self._embed_cached(texts, EmbeddingService._encode_texts)
 
-    def embed_chunks(self, chunks) -> list[np.ndarray]:
+    def embed_chunks(self, chunks) -> np.ndarray:
+        """
+        Embeds chunk texts into one contiguous (n, dim) float32 matrix;
+        row i belongs to chunks[i]. No per-row arrays are created.
+        """
         texts = [c.text for c in chunks]
-        mat = EmbeddingService._model.encode(texts, normalize_embeddings=True)
-        return [row.astype(np.float32) for row in mat]
\ No newline at end of file
+        if not texts:
+            dim = EmbeddingService._model.get_sentence_embedding_dimension()
+            return np.empty((0, dim), dtype=np.float32)
+        return self._embed_cached(
+            texts, lambda t: EmbeddingService._encode_bucketed(t, settings.EMBED_BULK_BATCH_SIZE)
+        )
\ No newline at end of file
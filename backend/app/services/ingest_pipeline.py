@@ -0,0 +1,398 @@
+import time
+from itertools import groupby
+from typing import Iterable, Iterator, List
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db import models, crud
+from app.services.parsing_service import stream_document, ParsedPage
+from app.services.chunking import iter_chunks, batched, Chunk
+from app.services.embeddings import EmbeddingService
+from app.services.vector_store import get_vector_store
+from app.services.ai_processor import AIProcessor
+from app.services.vision_service_ollama import get_image_caption_with_ollama_vlm, VISION_MODEL
+
+# Pipeline stages, in order. Every stage takes only a doc_id and reads its
+# inputs from Postgres, so consecutive stages can run in different processes.
+# Every stage is idempotent (replace/upsert), and once it finishes its
+# checkpoint is stored on the Document so a retry resumes after it.
+STAGE_PARSE = "parsing"
+STAGE_INDEX = "indexing"
+STAGE_ANALYSE = "analysing"
+STAGE_CAPTION = "captioning"
+STAGE_DONE = "done"
+
+CHECKPOINTS = {
+    STAGE_PARSE: "parsed",
+    STAGE_INDEX: "indexed",
+    STAGE_ANALYSE: "analysed",
+    STAGE_CAPTION: "captioned",
+}
+
+
+def mark_stage(doc_id: str, stage: str):
+    with SessionLocal() as db:
+        crud.set_document_status(db, doc_id, models.STATUS_PROCESSING, stage=stage)
+
+
+def mark_failed(doc_id: str, stage: str, error: Exception):
+    print(f"Error processing document {doc_id} during {stage}: {error}")
+    with SessionLocal() as db:
+        crud.set_document_status(db, doc_id, models.STATUS_FAILED, stage=stage, error=str(error))
+
+
+def stage_done(doc_id: str, stage: str) -> bool:
+    with SessionLocal() as db:
+        return CHECKPOINTS[stage] in crud.get_checkpoints(db, doc_id)
+
+
+def mark_stage_done(doc_id: str, stage: str):
+    with SessionLocal() as db:
+        crud.add_checkpoint(db, doc_id, CHECKPOINTS[stage])
+
+
+def _iter_stored_pages(db, doc_id: str) -> Iterator[ParsedPage]:
+    rows = db.query(models.Page)\
+        .filter(models.Page.doc_id == doc_id)\
+        .order_by(models.Page.page_number.asc())\
+        .yield_per(settings.INGEST_PAGE_BATCH)
+    for p in rows:
+        yield ParsedPage(
+            page_number=p.page_number,
+            text_raw=p.text_raw,
+            text_ocr=p.text_ocr,
+            lang_detected=p.lang_detected,
+            has_images=bool(p.has_images),
+        )
+
+
+def _persist_pages(doc_id: str, pages: Iterable[ParsedPage]) -> Iterator[ParsedPage]:
+    """Writes Page rows in batches of INGEST_PAGE_BATCH and passes the pages on once committed."""
+    with SessionLocal() as db:
+        count = 0
+        for batch in batched(pages, settings.INGEST_PAGE_BATCH):
+            for p in batch:
+                db.add(models.Page(
+                    doc_id=doc_id,
+                    page_number=p.page_number,
+                    text_raw=p.text_raw,
+                    text_ocr=p.text_ocr,
+                    lang_detected=p.lang_detected,
+                    has_images=p.has_images,
+                ))
+            count += len(batch)
+            # page_count doubles as progress while a long document is being parsed
+            db.query(models.Document).filter(models.Document.id == doc_id).update({"page_count": count})
+            db.commit()
+            yield from batch
+
+
+def _document_meta(doc_id: str) -> dict:
+    """Document-level search filter fields copied into every chunk payload."""
+    with SessionLocal() as db:
+        doc = db.query(models.Document).filter(models.Document.id == doc_id).first()
+        if not doc:
+            return {}
+        ai_out = db.query(models.AIOutput).filter(models.AIOutput.doc_id == doc_id).first()
+        return {
+            "mime_type": doc.mime_type,
+            # created_at is naive UTC
+            "uploaded_at": doc.created_at.isoformat() + "Z" if doc.created_at else None,
+            "classification": ai_out.classification if ai_out else None,
+        }
+
+
+def _index_chunks(doc_id: str, chunks: Iterable[Chunk]) -> int:
+    """
+    Embeds and upserts chunks in micro-batches of EMBED_BATCH_SIZE; memory
+    stays flat (at most QDRANT_UPSERT_CONCURRENCY upsert batches are pending).
+
+    Incremental: chunk ids are content hashes, so chunks already indexed for
+    the document (same id and pages) are neither embedded nor upserted again,
+    and points of the previous version whose text is gone are deleted at the end.
+    """
+    emb = EmbeddingService()
+    vs = get_vector_store()
+    existing = vs.document_chunks(doc_id)
+    writer = vs.writer()
+    meta = _document_meta(doc_id)
+    total = written = 0
+    current = set()
+    for batch in batched(chunks, settings.EMBED_BATCH_SIZE):
+        current.update(c.chunk_id for c in batch)
+        total += len(batch)
+        batch = [c for c in batch if existing.get(c.chunk_id) != (c.page_start, c.page_end)]
+        written += len(batch)
+        if batch:
+            # Upserts run in the background while the next batch is embedded
+            vs.upsert_chunks(doc_id, batch, emb.embed_chunks(batch), meta, writer=writer)
+    # Barrier: every point is applied before the stage (and document) is marked done
+    writer.flush()
+    stale = [pid for pid in existing if pid not in current]
+    if stale:
+        vs.delete_points(stale)
+    if existing:
+        print(f"Re-indexed {doc_id}: {total} chunks, {total - written} unchanged, {len(stale)} stale removed")
+    return total
+
+
+def parse_stage(doc_id: str) -> int:
+    """
+    Parses (and OCRs) the stored file and persists one Page row per page
+    (replacing any earlier rows). With INGEST_STREAMING the pages are also
+    chunked, embedded and upserted batch by batch while parsing continues,
+    so the first pages become searchable early and the index stage is skipped.
+    """
+    with SessionLocal() as db:
+        doc = db.query(models.Document).filter(models.Document.id == doc_id).first()
+        if not doc:
+            raise ValueError(f"Document {doc_id} not found")
+        storage_uri = doc.storage_uri
+        db.query(models.Page).filter(models.Page.doc_id == doc_id).delete()
+        db.commit()
+
+    stream = stream_document(storage_uri)
+    persisted = _persist_pages(doc_id, stream)
+    if settings.INGEST_STREAMING:
+        _index_chunks(doc_id, iter_chunks(persisted, doc_id))
+    else:
+        for _ in persisted:
+            pass
+
+    meta = stream.meta
+    with SessionLocal() as db:
+        db.query(models.Document).filter(models.Document.id == doc_id).update({
+            "language_primary": meta.language_primary,
+            "ocr_applied": meta.ocr_applied,
+            "page_count": stream.page_count,
+        })
+        db.commit()
+    if settings.INGEST_STREAMING:
+        mark_stage_done(doc_id, STAGE_INDEX)
+    return stream.page_count
+
+
+def index_stage(doc_id: str) -> int:
+    """Chunks the stored pages, embeds the chunks and upserts them to Qdrant, in bounded batches."""
+    with SessionLocal() as db:
+        return _index_chunks(doc_id, iter_chunks(_iter_stored_pages(db, doc_id), doc_id))
+
+
+def _context_chunks(doc_id: str, max_chars: int = 15000) -> List[Chunk]:
+    """Leading chunks up to the LLM context budget, without chunking the whole document."""
+    chunks: List[Chunk] = []
+    total = 0
+    with SessionLocal() as db:
+        for c in iter_chunks(_iter_stored_pages(db, doc_id), doc_id):
+            chunks.append(c)
+            total += len(c.text)
+            if total >= max_chars:
+                break
+    return chunks
+
+
+def analyse_stage(doc_id: str):
+    """Runs LLM summary, classification and extraction and stores (or replaces) the AIOutput."""
+    outputs = AIProcessor().process_document(_context_chunks(doc_id))
+    with SessionLocal() as db:
+        ai_out = db.query(models.AIOutput).filter(models.AIOutput.doc_id == doc_id).first()
+        if not ai_out:
+            ai_out = models.AIOutput(doc_id=doc_id)
+            db.add(ai_out)
+        ai_out.summary = outputs.summary
+        ai_out.classification = outputs.classification.label
+        ai_out.classification_confidence = outputs.classification.confidence
+        ai_out.extraction = outputs.extraction
+        ai_out.model_version = outputs.model_version
+        db.commit()
+    # Chunks are indexed before the LLM runs; make the label filterable on them
+    get_vector_store().set_document_payload(doc_id, {"classification": outputs.classification.label})
+    return outputs
+
+
+def caption_stage(doc_id: str) -> int:
+    """Captions the images extracted during parsing with the VLM (skipping already captioned ones)."""
+    with SessionLocal() as db:
+        images = [i for i in crud.get_images_for_doc(db, doc_id) if not i.caption]
+        for image in images:
+            caption = get_image_caption_with_ollama_vlm(image.storage_uri)
+            crud.save_caption_for_image(
+                db,
+                storage_uri=image.storage_uri,
+                caption=caption,
+                model_version=VISION_MODEL
+            )
+        return len(images)
+
+
+def mark_completed(doc_id: str):
+    with SessionLocal() as db:
+        crud.set_document_status(db, doc_id, models.STATUS_COMPLETED, stage=STAGE_DONE)
+
+
+STAGES = [
+    (STAGE_PARSE, parse_stage),
+    (STAGE_INDEX, index_stage),
+    (STAGE_ANALYSE, analyse_stage),
+    (STAGE_CAPTION, caption_stage),
+]
+
+
+def reset_document(doc_id: str):
+    """
+    Forgets all checkpoints so the next run starts from parsing. Indexed
+    points are kept: the index stage diffs them against the new chunks.
+    """
+    with SessionLocal() as db:
+        crud.clear_checkpoints(db, doc_id)
+
+
+def run_stage(doc_id: str, stage: str, fn) -> bool:
+    """
+    Runs one stage unless its checkpoint is already recorded.
+    Returns False when the stage was skipped.
+    """
+    if stage_done(doc_id, stage):
+        return False
+    mark_stage(doc_id, stage)
+    fn(doc_id)
+    mark_stage_done(doc_id, stage)
+    return True
+
+
+def run_pipeline(doc_id: str):
+    """
+    Runs every unfinished stage in-process (used by the synchronous upload
+    and reprocess paths), resuming after the last recorded checkpoint.
+    """
+    for stage, fn in STAGES:
+        try:
+            run_stage(doc_id, stage, fn)
+        except Exception as e:
+            mark_failed(doc_id, stage, e)
+            raise
+    mark_completed(doc_id)
+
+
+def _document_ids(*statuses: str) -> List[str]:
+    with SessionLocal() as db:
+        return [d for (d,) in db.query(models.Document.id)
+                .filter(models.Document.status.in_(statuses))
+                .order_by(models.Document.created_at.asc())]
+
+
+def _iter_document_chunks(doc_ids: Iterable[str]) -> Iterator[Chunk]:
+    for doc_id in doc_ids:
+        with SessionLocal() as db:
+            yield from iter_chunks(_iter_stored_pages(db, doc_id), doc_id)
+
+
+def reindex_documents(doc_ids: List[str] | None = None, processes: int | None = None, store=None) -> int:
+    """
+    Backfill: re-chunks the stored pages of many documents (default: all
+    completed ones) and re-embeds them in EMBED_BULK_GROUP-sized groups via
+    EmbeddingService.embed_bulk, upserting each group (into `store`, default
+    the configured vector store). Prints chunks/s.
+    """
+    if doc_ids is None:
+        doc_ids = _document_ids(models.STATUS_COMPLETED)
+    emb = EmbeddingService()
+    vs = store or get_vector_store()
+    writer = vs.writer()
+    metas = {}
+    total = 0
+    t0 = time.perf_counter()
+    # One encode pool for the whole run (its workers each load the model)
+    with emb.bulk_pool(processes) as pool:
+        for group in batched(_iter_document_chunks(doc_ids), settings.EMBED_BULK_GROUP):
+            vectors = emb.embed_bulk([c.text for c in group], processes=1, pool=pool)
+            start = 0
+            for doc_id, run in groupby(group, key=lambda c: c.doc_id):
+                run = list(run)
+                if doc_id not in metas:
+                    metas[doc_id] = _document_meta(doc_id)
+                vs.upsert_chunks(doc_id, run, vectors[start:start + len(run)], metas[doc_id], writer=writer)
+                start += len(run)
+            total += len(group)
+    writer.flush()
+    dt = max(time.perf_counter() - t0, 1e-9)
+    print(f"Re-indexed {total} chunks from {len(doc_ids)} documents in {dt:.1f}s ({total / dt:.1f} chunks/s)")
+    return total
+
+
+def remove_orphan_vectors(batch_size: int = 1000) -> dict:
+    """
+    Garbage-collects Qdrant points whose document no longer exists in
+    Postgres (e.g. a delete whose vector cleanup failed). The collection is
+    scrolled in batches (doc_id payload only); each batch's doc_ids are
+    checked against `documents` and orphans are removed by indexed filter.
+    """
+    vs = get_vector_store()
+    seen, orphans = set(), set()
+    for ids in vs.iter_doc_id_batches(batch_size):
+        ids -= seen
+        if not ids:
+            continue
+        seen |= ids
+        with SessionLocal() as db:
+            existing = {d for (d,) in db.query(models.Document.id).filter(models.Document.id.in_(list(ids)))}
+        missing = ids - existing
+        if missing:
+            vs.delete_documents(list(missing))
+            orphans |= missing
+    if orphans:
+        print(f"Removed vectors of {len(orphans)} orphaned documents")
+    return {"documents_checked": len(seen), "orphans_removed": len(orphans)}
+
+
+def rebuild_collection(drop_old: bool = False, force: bool = False) -> str:
+    """
+    Blue/green re-index for a new embedding model or chunking config (run it
+    with the new settings): fills the versioned collection for the current
+    config from the stored page text (unchanged texts come from the embedding
+    cache), catches up on documents completed meanwhile, then points the
+    COLLECTION_NAME alias at it atomically. Every process reads and writes
+    the version of its own config, so processes still on the old settings
+    keep serving the old collection, and documents they index after the
+    switch only land there. Run it again once every process has the new
+    settings: with the alias already switched it only re-indexes completed
+    documents missing from the new collection. With drop_old, the previous
+    live collection is deleted (by default it is kept for rollback).
+    """
+    from app.services.vector_store_qdrant import VectorStore, collection_version_name
+
+    if not settings.COLLECTION_VERSIONING or settings.VECTOR_BACKEND != "qdrant":
+        raise ValueError("rebuild_collection needs VECTOR_BACKEND=qdrant and COLLECTION_VERSIONING=true")
+    dim = EmbeddingService()._model.get_sentence_embedding_dimension()
+    if dim != settings.EMBEDDING_DIM:
+        raise ValueError(f"EMBEDDING_DIM={settings.EMBEDDING_DIM} but {settings.EMBEDDING_MODEL} produces {dim}-d vectors")
+
+    target = collection_version_name()
+    vs = VectorStore(collection=target)
+    previous = vs.alias_target()
+    if previous == target and not force:
+        # Catch-up: documents completed by processes that were still on the old settings after the switch
+        indexed = set().union(*vs.iter_doc_id_batches())
+        missing = [d for d in _document_ids(models.STATUS_COMPLETED) if d not in indexed]
+        if missing:
+            reindex_documents(missing, store=vs)
+        print(f"Alias '{vs.alias}' already points at '{target}'; re-indexed {len(missing)} missing documents")
+        return target
+
+    doc_ids = _document_ids(models.STATUS_COMPLETED)
+    total = reindex_documents(doc_ids, store=vs)
+    # Documents completed while the bulk pass ran (by processes on the old settings, into the old collection)
+    done = set(doc_ids)
+    late = [d for d in _document_ids(models.STATUS_COMPLETED) if d not in done]
+    if late:
+        total += reindex_documents(late, store=vs)
+    vs.switch_alias(target, keep_legacy=not drop_old)
+    # Documents in the pipeline on processes with the old settings were (partly) indexed into the old
+    # collection; re-index the pages they have so far (running again later catches up on the rest)
+    in_flight = _document_ids(models.STATUS_QUEUED, models.STATUS_PROCESSING)
+    if in_flight:
+        total += reindex_documents(in_flight, store=vs)
+    print(f"Collection '{target}' is live with {total} chunks (previous: {previous or vs.alias})")
+    if drop_old and previous and previous != target:
+        vs.client.delete_collection(previous)
+        print(f"Dropped '{previous}'")
+    return target
@@ -1,10 +1,101 @@
-from langdetect import detect
-from typing import Optional
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from langdetect import DetectorFactory, detect
+from typing import List, Optional
+from app.core.config import settings
 
-def detect_language(text: str) -> Optional[str]:
+# langdetect is randomised unless seeded; seed once so results are reproducible
+DetectorFactory.seed = 0
+
+# How much of each text is looked at
+MAX_CHARS = 2000
+
+# Non-Latin scripts identify the language on their own (ISO 639-1 codes, as langdetect returns)
+_SCRIPTS = [
+    ("ml", re.compile(r"[\u0D00-\u0D7F]")),  # Malayalam
+    ("ta", re.compile(r"[\u0B80-\u0BFF]")),  # Tamil
+    ("kn", re.compile(r"[\u0C80-\u0CFF]")),  # Kannada
+    ("te", re.compile(r"[\u0C00-\u0C7F]")),  # Telugu
+    ("hi", re.compile(r"[\u0900-\u097F]")),  # Devanagari
+    ("ar", re.compile(r"[\u0600-\u06FF]")),  # Arabic
+]
+_LATIN = re.compile(r"[A-Za-z\u00C0-\u024F]")
+
+_cache: "OrderedDict[bytes, Optional[str]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8", "ignore"), digest_size=16).digest()
+
+
+def _by_script(text: str) -> tuple[Optional[str], bool]:
+    """
+    Classifies by Unicode script. Returns (lang, ambiguous): a dominant
+    non-Latin script decides the language outright; Latin text is ambiguous
+    and needs the statistical model.
+    """
+    latin = len(_LATIN.findall(text))
+    best, best_count = None, 0
+    for lang, pattern in _SCRIPTS:
+        n = len(pattern.findall(text))
+        if n > best_count:
+            best, best_count = lang, n
+    if best_count and best_count >= latin:
+        return best, False
+    return None, latin > 0
+
+
+def _statistical(text: str) -> Optional[str]:
     try:
-        if not text or not text.strip():
-            return None
         return detect(text)
     except Exception:
-        return None
\ No newline at end of file
+        return None
+
+
+def _cached(key: bytes):
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return True, _cache[key]
+    return False, None
+
+
+def _remember(key: bytes, lang: Optional[str]):
+    with _cache_lock:
+        _cache[key] = lang
+        _cache.move_to_end(key)
+        while len(_cache) > settings.LANGDET_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def detect_languages(texts: List[str]) -> List[Optional[str]]:
+    """
+    Detects the language of many texts (e.g. all pages of a document) in one
+    pass: script ranges first, the seeded langdetect model only for ambiguous
+    Latin text, and results cached by text hash (identical pages are detected once).
+    """
+    results: List[Optional[str]] = [None] * len(texts)
+    # Identical texts in the batch are grouped and detected once
+    groups: dict[bytes, tuple[str, List[int]]] = {}
+    for i, text in enumerate(texts):
+        text = (text or "")[:MAX_CHARS]
+        if text.strip():
+            groups.setdefault(_key(text), (text, []))[1].append(i)
+
+    for key, (text, idxs) in groups.items():
+        hit, lang = _cached(key)
+        if not hit:
+            lang, ambiguous = _by_script(text)
+            if ambiguous:
+                lang = _statistical(text)
+            _remember(key, lang)
+        for i in idxs:
+            results[i] = lang
+    return results
+
+
+def detect_language(text: str) -> Optional[str]:
+    return detect_languages([text])[0]
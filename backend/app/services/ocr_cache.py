@@ -0,0 +1,126 @@
+import hashlib
+import threading
+from datetime import datetime
+from typing import Optional
+from PIL import Image
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db import models
+
+# Stores made by this process, only used to pace evict()
+_stores = 0
+_lock = threading.Lock()
+
+
+def _count(db, name: str, n: int = 1):
+    """Adds `n` to a persisted counter (committed by the caller)."""
+    if n <= 0:
+        return
+    stmt = insert(models.OCRCacheCounter).values(name=name, value=n)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"value": models.OCRCacheCounter.value + stmt.excluded.value},
+    ))
+
+
+def stats() -> dict:
+    """
+    Cache-wide statistics across all API/worker processes: hits and size come
+    from the cache rows themselves (hits of evicted entries drop out), misses
+    and evictions from the ocr_cache_counters table.
+    """
+    with SessionLocal() as db:
+        entries, size, hits = db.query(
+            func.count(models.OCRCacheEntry.key),
+            func.coalesce(func.sum(models.OCRCacheEntry.size_bytes), 0),
+            func.coalesce(func.sum(models.OCRCacheEntry.hits), 0),
+        ).one()
+        counters = dict(db.query(models.OCRCacheCounter.name, models.OCRCacheCounter.value).all())
+    return {
+        "entries": int(entries),
+        "size_bytes": int(size),
+        "hits": int(hits),
+        "misses": int(counters.get("misses", 0)),
+        "evictions": int(counters.get("evictions", 0)),
+    }
+
+
+def image_key(image: Image.Image, lang: str, dpi: int | None) -> str:
+    """Cache key: SHA-256 of the rendered pixels (plus mode/size), the Tesseract language pack and DPI."""
+    h = hashlib.sha256(f"{image.mode}:{image.width}x{image.height}:".encode())
+    h.update(image.tobytes())
+    return f"{h.hexdigest()}:{lang}:{dpi or 0}"
+
+
+def get(key: str) -> Optional[str]:
+    """Cached OCR text for `key` ("" when the image had no text), or None on a miss."""
+    if not settings.OCR_CACHE_ENABLED:
+        return None
+    try:
+        with SessionLocal() as db:
+            entry = db.query(models.OCRCacheEntry).filter(models.OCRCacheEntry.key == key).first()
+            if entry is None:
+                _count(db, "misses")
+                db.commit()
+                return None
+            entry.hits = (entry.hits or 0) + 1
+            entry.last_used_at = datetime.utcnow()
+            text = entry.text
+            db.commit()
+        return text
+    except Exception as e:
+        print(f"OCR cache lookup failed: {e}")
+        return None
+
+
+def put(key: str, text: str):
+    if not settings.OCR_CACHE_ENABLED:
+        return
+    try:
+        with SessionLocal() as db:
+            stmt = insert(models.OCRCacheEntry).values(
+                key=key,
+                text=text,
+                # key length stands in for per-row overhead so empty results count too
+                size_bytes=len(text.encode("utf-8")) + len(key),
+                hits=0,
+                created_at=datetime.utcnow(),
+                last_used_at=datetime.utcnow(),
+            ).on_conflict_do_nothing(index_elements=["key"])
+            db.execute(stmt)
+            db.commit()
+        global _stores
+        with _lock:
+            _stores += 1
+            due = _stores % max(1, settings.OCR_CACHE_EVICT_EVERY) == 0
+        if due:
+            evict()
+    except Exception as e:
+        print(f"OCR cache store failed: {e}")
+
+
+def evict() -> int:
+    """Drops least-recently-used entries until the cache fits OCR_CACHE_MAX_BYTES."""
+    with SessionLocal() as db:
+        total = db.query(func.coalesce(func.sum(models.OCRCacheEntry.size_bytes), 0)).scalar() or 0
+        excess = total - settings.OCR_CACHE_MAX_BYTES
+        if excess <= 0:
+            return 0
+        victims = []
+        rows = db.query(models.OCRCacheEntry.key, models.OCRCacheEntry.size_bytes)\
+            .order_by(models.OCRCacheEntry.last_used_at.asc())\
+            .yield_per(1000)
+        for key, size in rows:
+            victims.append(key)
+            excess -= size or 0
+            if excess <= 0:
+                break
+        for i in range(0, len(victims), 1000):
+            db.query(models.OCRCacheEntry)\
+                .filter(models.OCRCacheEntry.key.in_(victims[i:i + 1000]))\
+                .delete(synchronize_session=False)
+        _count(db, "evictions", len(victims))
+        db.commit()
+    return len(victims)
@@ -1,27 +1,62 @@
 import pytesseract
 from PIL import Image
 from typing import Optional
-import tempfile
+from app.core.config import settings
+from app.services import ocr_cache
+
+# Using "eng+mal" for English and Malayalam as per your original config
+OCR_LANG = "eng+mal"
+
+def pixmap_to_image(pixmap) -> Image.Image:
+    """
+    Wraps a PyMuPDF pixmap's sample buffer as a PIL image (no PNG encode /
+    temp-file round-trip).
+    """
+    if pixmap.alpha:
+        mode = "RGBA"
+    elif pixmap.n == 1:
+        mode = "L"
+    elif pixmap.n == 4:
+        mode = "CMYK"
+    else:
+        mode = "RGB"
+    img = Image.frombytes(mode, (pixmap.width, pixmap.height), pixmap.samples)
+    return img.convert("RGB") if mode == "CMYK" else img
+
+def ocr_dpi_for(width_pt: float, height_pt: float) -> int:
+    """
+    Render resolution for OCR: aims for OCR_TARGET_PIXELS on the long side,
+    clamped to [OCR_MIN_DPI, OCR_MAX_DPI]. Small regions (stamps, tables)
+    get more pixels, oversized scans are not rendered at poster resolution.
+    """
+    long_side = max(width_pt, height_pt, 1.0)
+    dpi = settings.OCR_TARGET_PIXELS * 72.0 / long_side
+    return int(max(settings.OCR_MIN_DPI, min(settings.OCR_MAX_DPI, dpi)))
 
 # Keep the original function for PDF parsing, but have it call the new one
-def ocr_page_pixmap(pixmap) -> Optional[str]:
-    # Convert PyMuPDF pixmap to PIL image
-    with tempfile.NamedTemporaryFile(suffix=".png") as tmp:
-        pixmap.save(tmp.name)
-        img = Image.open(tmp.name)
-        # Now call our more generic function
-        return ocr_image(img)
+def ocr_page_pixmap(pixmap, dpi: int | None = None) -> Optional[str]:
+    # Convert PyMuPDF pixmap to PIL image straight from its samples
+    return ocr_image(pixmap_to_image(pixmap), dpi=dpi)
 
 # NEW: This is the missing function that needs to be added.
-def ocr_image(image: Image.Image) -> Optional[str]:
+def ocr_image(image: Image.Image, dpi: int | None = None) -> Optional[str]:
     """
     Performs OCR on a given PIL Image object.
+    Results are cached by image hash + language pack + DPI (see ocr_cache),
+    so repeated cover pages, letterheads and forms skip Tesseract.
     """
+    key = ocr_cache.image_key(image, OCR_LANG, dpi) if settings.OCR_CACHE_ENABLED else None
+    if key:
+        cached = ocr_cache.get(key)
+        if cached is not None:
+            return cached or None
     try:
-        # Using "eng+mal" for English and Malayalam as per your original config
-        txt = pytesseract.image_to_string(image, lang="eng+mal")
-        return txt.strip() if txt and txt.strip() else None
+        txt = pytesseract.image_to_string(image, lang=OCR_LANG)
+        txt = txt.strip() if txt and txt.strip() else None
     except Exception as e:
         # It's good practice to log the error
         print(f"Error during OCR: {e}")
-        return None
\ No newline at end of file
+        return None
+    if key:
+        ocr_cache.put(key, txt or "")
+    return txt
@@ -1,11 +1,14 @@
 import os
 import uuid
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import fitz # PyMuPDF
 from docx import Document as DocxDocument
-from typing import List, Tuple
+from collections import deque
+from typing import Iterable, Iterator, List, Optional, Tuple
 from dataclasses import dataclass
-from app.services.ocr_service import ocr_page_pixmap, ocr_image # <--- Import ocr_image
-from app.services.langdet import detect_language
+from app.services.ocr_service import ocr_page_pixmap, ocr_image, ocr_dpi_for # <--- Import ocr_image
+from app.services.langdet import detect_language, detect_languages
 from app.core.config import settings
 from PIL import Image # <--- Import the Image library
 
@@ -22,44 +25,170 @@ class ParseMeta:
     language_primary: str | None
     ocr_applied: bool
 
-def parse_pdf(path: str) -> Tuple[List[ParsedPage], ParseMeta]:
+def _image_regions(page, imgs) -> List["fitz.Rect"]:
+    """On-page rectangles of the page's images, skipping tiny ones (bullets, rules, logos)."""
+    rects = []
+    for img in imgs:
+        try:
+            for r in page.get_image_rects(img[0]):
+                r = r & page.rect
+                if not r.is_empty and r.width * r.height >= settings.OCR_REGION_MIN_AREA:
+                    rects.append(r)
+        except Exception:
+            continue
+    return rects
+
+def _ocr_regions(page, rects) -> Optional[str]:
+    texts = []
+    for r in rects:
+        dpi = ocr_dpi_for(r.width, r.height)
+        pix = page.get_pixmap(dpi=dpi, clip=r, alpha=False)
+        txt = ocr_page_pixmap(pix, dpi=dpi)
+        if txt:
+            texts.append(txt)
+    return "\n\n".join(texts) or None
+
+def _ocr_full_page(page) -> Optional[str]:
+    dpi = ocr_dpi_for(page.rect.width, page.rect.height)
+    pix = page.get_pixmap(dpi=dpi, alpha=False)
+    return ocr_page_pixmap(pix, dpi=dpi)
+
+def _ocr_pdf_page(page, text_raw: str, imgs) -> Optional[str]:
+    """
+    OCR for one PDF page. Low-text pages are OCR'd as a whole; with
+    OCR_MODE=regions, a low-text page whose images cover only a small part of
+    it is OCR'd region by region instead, and pages that do have a text layer
+    get their image regions OCR'd and appended to that text.
+    """
+    low_text = len(text_raw.strip()) < 20
+    if settings.OCR_MODE != "regions":
+        return _ocr_full_page(page) if low_text else None
+
+    rects = _image_regions(page, imgs)
+    if low_text:
+        page_area = max(page.rect.width * page.rect.height, 1.0)
+        coverage = sum(r.width * r.height for r in rects) / page_area
+        if not rects or coverage >= settings.OCR_REGION_MAX_COVERAGE:
+            return _ocr_full_page(page)
+        return _ocr_regions(page, rects)
+    if not rects:
+        return None
+    region_text = _ocr_regions(page, rects)
+    # text_ocr is what gets chunked, so keep the text layer alongside the OCR'd regions
+    return f"{text_raw.strip()}\n\n{region_text}" if region_text else None
+
+def _parse_pdf_page(page, page_number: int) -> ParsedPage:
+    text_raw = page.get_text("text") or ""
+    imgs = page.get_images(full=True)
+    has_images = len(imgs) > 0
+    text_ocr = _ocr_pdf_page(page, text_raw, imgs)
+
+    return ParsedPage(
+        page_number=page_number,
+        text_raw=text_raw if text_raw.strip() else None,
+        text_ocr=text_ocr,
+        lang_detected=None,  # filled per batch by _parse_pdf_pages
+        has_images=has_images
+    )
+
+def _parse_pdf_pages(doc, start: int, end: int) -> List[ParsedPage]:
+    pages = [_parse_pdf_page(doc[i], i + 1) for i in range(start, end)]
+    # One language-detection call for the whole batch of pages
+    langs = detect_languages([p.text_ocr or p.text_raw or "" for p in pages])
+    for p, lang in zip(pages, langs):
+        p.lang_detected = lang
+    return pages
+
+def _parse_pdf_range(path: str, start: int, end: int) -> List[ParsedPage]:
+    """Parses pages [start, end) with its own fitz handle (runs inside pool workers)."""
     doc = fitz.open(path)
-    pages: List[ParsedPage] = []
-    ocr_applied_any = False
-    langs = {}
-
-    for i in range(len(doc)):
-        page = doc[i]
-        text_raw = page.get_text("text") or ""
-        imgs = page.get_images(full=True)
-        has_images = len(imgs) > 0
-        text_ocr = None
+    try:
+        return _parse_pdf_pages(doc, start, end)
+    finally:
+        doc.close()
 
-        # If text is very short, attempt OCR
-        if len(text_raw.strip()) < 20:
-            # render page to image
-            pix = page.get_pixmap(dpi=200)
-            text_ocr = ocr_page_pixmap(pix)
-            if text_ocr:
-                ocr_applied_any = True
+def _page_ranges(page_count: int, workers: int) -> List[Tuple[int, int]]:
+    # A few ranges per worker so one OCR-heavy range does not leave the others idle, each at most
+    # INGEST_PAGE_BATCH pages so the window below holds a bounded number of pages for any document size
+    step = max(1, min(-(-page_count // (workers * 4)), settings.INGEST_PAGE_BATCH))
+    return [(s, min(s + step, page_count)) for s in range(0, page_count, step)]
 
-        lang = detect_language((text_ocr or text_raw)[:2000])
-        if lang:
-            langs[lang] = langs.get(lang, 0) + 1
+def _windowed(submit, ranges: deque, workers: int) -> Iterator[ParsedPage]:
+    """Keeps at most workers * 2 ranges (workers * 2 * INGEST_PAGE_BATCH pages) in flight and yields their pages in order."""
+    in_flight = deque()
+    while ranges or in_flight:
+        while ranges and len(in_flight) < workers * 2:
+            s, e = ranges.popleft()
+            in_flight.append(submit(s, e))
+        yield from in_flight.popleft()()
 
-        pages.append(ParsedPage(
-            page_number=i+1,
-            text_raw=text_raw if text_raw.strip() else None,
-            text_ocr=text_ocr,
-            lang_detected=lang,
-            has_images=has_images
-        ))
+def _iter_pdf_parallel(path: str, ranges: deque, workers: int) -> Iterator[ParsedPage]:
+    if not multiprocessing.current_process().daemon:
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            yield from _windowed(lambda s, e: pool.submit(_parse_pdf_range, path, s, e).result, ranges, workers)
+        return
+    # Celery prefork children are daemonic and multiprocessing will not start processes from them;
+    # billiard (Celery's multiprocessing fork, installed with it) allows it
+    import billiard
+    pool = billiard.get_context("spawn").Pool(processes=workers)
+    try:
+        yield from _windowed(lambda s, e: pool.apply_async(_parse_pdf_range, (path, s, e)).get, ranges, workers)
+    finally:
+        pool.terminate()
+        pool.join()
 
-    language_primary = None
-    if langs:
-        language_primary = max(langs.items(), key=lambda kv: kv[1])[0]
+def iter_pdf_pages(path: str) -> Iterator[ParsedPage]:
+    """
+    Yields the parsed pages of a PDF in page order, OCRing pages with little
+    or no text layer. PDFs with at least PDF_PARALLEL_MIN_PAGES pages are
+    split into page ranges parsed across a process pool of PDF_PARSE_WORKERS
+    workers (a billiard pool inside Celery workers); ranges hold at most
+    INGEST_PAGE_BATCH pages and only a bounded window of them is in flight.
+    """
+    with fitz.open(path) as doc:
+        page_count = len(doc)
+
+    workers = min(settings.PDF_PARSE_WORKERS, page_count)
+    if workers > 1 and page_count >= settings.PDF_PARALLEL_MIN_PAGES:
+        yield from _iter_pdf_parallel(path, deque(_page_ranges(page_count, workers)), workers)
+    else:
+        step = max(1, settings.INGEST_PAGE_BATCH)
+        with fitz.open(path) as doc:
+            for start in range(0, page_count, step):
+                yield from _parse_pdf_pages(doc, start, min(start + step, page_count))
+
+class PageStream:
+    """
+    Iterates parsed pages lazily and accumulates the ParseMeta (primary
+    language, OCR flag) as they are consumed; read .meta after iterating.
+    """
+    def __init__(self, pages: Iterable[ParsedPage], ocr_applied: bool = False):
+        self._pages = pages
+        self._langs = {}
+        self._ocr_applied = ocr_applied
+        self.page_count = 0
+
+    def __iter__(self) -> Iterator[ParsedPage]:
+        for p in self._pages:
+            self.page_count += 1
+            if p.text_ocr:
+                self._ocr_applied = True
+            if p.lang_detected:
+                self._langs[p.lang_detected] = self._langs.get(p.lang_detected, 0) + 1
+            yield p
 
-    return pages, ParseMeta(language_primary=language_primary, ocr_applied=ocr_applied_any)
+    @property
+    def meta(self) -> ParseMeta:
+        language_primary = None
+        if self._langs:
+            language_primary = max(self._langs.items(), key=lambda kv: kv[1])[0]
+        return ParseMeta(language_primary=language_primary, ocr_applied=self._ocr_applied)
+
+def parse_pdf(path: str) -> Tuple[List[ParsedPage], ParseMeta]:
+    stream = PageStream(iter_pdf_pages(path))
+    pages = list(stream)
+    return pages, stream.meta
 
 def parse_docx(path: str) -> Tuple[List[ParsedPage], ParseMeta]:
     doc = DocxDocument(path)
@@ -76,7 +205,8 @@ def parse_image(path: str) -> Tuple[List[ParsedPage], ParseMeta]:
     """
     try:
         img = Image.open(path)
-        text_ocr = ocr_image(img)
+        dpi = img.info.get("dpi")
+        text_ocr = ocr_image(img, dpi=int(dpi[0]) if dpi else None)
     except Exception as e:
         print(f"Could not open or OCR image {path}: {e}")
         text_ocr = None
@@ -111,3 +241,14 @@ def parse_document(path: str) -> Tuple[List[ParsedPage], ParseMeta]:
         return parse_image(path)
     else:
         raise ValueError("Unsupported file type")
+
+def stream_document(path: str) -> PageStream:
+    """
+    Like parse_document, but PDF pages are produced one at a time so callers
+    can persist/chunk/embed them in bounded batches while parsing continues.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pdf":
+        return PageStream(iter_pdf_pages(path))
+    pages, meta = parse_document(path)
+    return PageStream(pages, ocr_applied=meta.ocr_applied)
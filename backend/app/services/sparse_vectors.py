@@ -0,0 +1,63 @@
+import hashlib
+import re
+from collections import Counter
+from typing import List, Tuple
+from app.core.config import settings
+
+# Whitespace/bracket/quote separated tokens; script-agnostic so Malayalam
+# vowel signs stay attached to their words
+_TOKEN = re.compile(r"[^\s,;:!?()\[\]{}\"'“”‘’<>|]+")
+# Separators inside identifiers such as INV-2024/0017 or PO.5531
+_JOINERS = re.compile(r"[-/._#]+")
+_EDGE_PUNCT = "-/._#*"
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-cased lexical tokens. Identifiers keep their full form (so an exact
+    invoice/PO number or equipment tag matches as one term) and also
+    contribute their alphanumeric parts.
+    """
+    tokens = []
+    for raw in _TOKEN.findall((text or "").lower()):
+        tok = raw.strip(_EDGE_PUNCT)
+        if not tok:
+            continue
+        tokens.append(tok)
+        parts = [p for p in _JOINERS.split(tok) if p]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def _index(token: str) -> int:
+    # Stable across processes (unlike hash()); Qdrant sparse indices are uint32
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def _to_sparse(weights: dict) -> Tuple[List[int], List[float]]:
+    merged: dict[int, float] = {}
+    for tok, w in weights.items():
+        i = _index(tok)
+        merged[i] = merged.get(i, 0.0) + w
+    indices = sorted(merged)
+    return indices, [merged[i] for i in indices]
+
+
+def encode_document(text: str) -> Tuple[List[int], List[float]]:
+    """
+    BM25 term weights for a chunk: tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl)).
+    The IDF factor is applied by Qdrant at query time (sparse vector modifier=idf),
+    so it always reflects the current collection.
+    """
+    tf = Counter(tokenize(text))
+    if not tf:
+        return [], []
+    k1, b = settings.BM25_K1, settings.BM25_B
+    norm = k1 * (1 - b + b * sum(tf.values()) / max(settings.BM25_AVG_DOC_TOKENS, 1))
+    return _to_sparse({tok: n * (k1 + 1) / (n + norm) for tok, n in tf.items()})
+
+
+def encode_query(text: str) -> Tuple[List[int], List[float]]:
+    """Query side of BM25: each distinct term with weight 1 (IDF comes from Qdrant)."""
+    return _to_sparse({tok: 1.0 for tok in set(tokenize(text))})
@@ -0,0 +1,41 @@
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, Tuple
+from app.core.config import settings
+
+
+def store_upload(src: BinaryIO, ext: str) -> Tuple[str, str, int]:
+    """
+    Streams an upload to STORAGE_DIR in fixed-size blocks while hashing it,
+    then stores it content-addressed as {sha256}{ext}.
+    Returns (storage_uri, sha256_hex, size_bytes). Identical bytes map to the
+    same file, so a re-upload does not create a second copy on disk.
+    """
+    os.makedirs(settings.STORAGE_DIR, exist_ok=True)
+    block = max(64 * 1024, settings.UPLOAD_BLOCK_BYTES)
+    digest = hashlib.sha256()
+    size = 0
+
+    fd, tmp_path = tempfile.mkstemp(dir=settings.STORAGE_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as dst:
+            while True:
+                buf = src.read(block)
+                if not buf:
+                    break
+                digest.update(buf)
+                dst.write(buf)
+                size += len(buf)
+
+        sha256 = digest.hexdigest()
+        storage_uri = os.path.join(settings.STORAGE_DIR, f"{sha256}{ext}")
+        if size == 0 or os.path.exists(storage_uri):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, storage_uri)
+        return storage_uri, sha256, size
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
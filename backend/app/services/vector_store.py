@@ -0,0 +1,14 @@
+from app.core.config import settings
+
+
+def get_vector_store():
+    """
+    The configured vector store: VECTOR_BACKEND=qdrant (default) or local
+    (in-process memory-mapped index, see vector_store_local). Both expose the
+    same methods, filters and hit objects.
+    """
+    if settings.VECTOR_BACKEND == "local":
+        from app.services.vector_store_local import LocalVectorStore
+        return LocalVectorStore()
+    from app.services.vector_store_qdrant import VectorStore
+    return VectorStore()
@@ -0,0 +1,516 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import List
+import numpy as np
+from qdrant_client.http import models as qm
+from app.core.config import settings
+from app.services.vector_store_qdrant import VectorStore as QdrantVectorStore, collection_version_name
+
+_hnswlib_warned = False
+
+
+def _as_datetime(value):
+    if value is None or isinstance(value, datetime):
+        dt = value
+    else:
+        try:
+            dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if dt is not None and dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def _condition_matches(payload: dict, cond) -> bool:
+    value = payload.get(cond.key)
+    match = getattr(cond, "match", None)
+    if isinstance(match, qm.MatchAny):
+        return value in match.any
+    if isinstance(match, qm.MatchValue):
+        return value == match.value
+    rng = getattr(cond, "range", None)
+    if rng is not None:
+        if isinstance(rng, qm.DatetimeRange):
+            value = _as_datetime(value)
+            bounds = [_as_datetime(b) for b in (rng.gt, rng.gte, rng.lt, rng.lte)]
+        else:
+            bounds = [rng.gt, rng.gte, rng.lt, rng.lte]
+        if value is None:
+            return False
+        gt, gte, lt, lte = bounds
+        return ((gt is None or value > gt) and (gte is None or value >= gte)
+                and (lt is None or value < lt) and (lte is None or value <= lte))
+    raise ValueError(f"Unsupported filter condition for the local vector index: {cond!r}")
+
+
+def filter_matches(payload: dict, flt: qm.Filter | None) -> bool:
+    """Evaluates the subset of Qdrant filters VectorStore.build_filter produces (must / should / must_not)."""
+    if flt is None:
+        return True
+    if flt.must and not all(_condition_matches(payload, c) for c in flt.must):
+        return False
+    if flt.must_not and any(_condition_matches(payload, c) for c in flt.must_not):
+        return False
+    if flt.should and not any(_condition_matches(payload, c) for c in flt.should):
+        return False
+    return True
+
+
+class LocalIndex:
+    """
+    In-process vector index persisted under one directory.
+
+    Vectors live in a growable, memory-mapped float32 matrix (vectors.f32);
+    a SQLite table maps each point id to its row (slot), doc_id and payload.
+    Every write bumps a sequence number, and deletions leave a tombstone
+    (which also marks the slot as free for reuse), so each process catches up
+    on other processes' writes incrementally before it searches.
+
+    Search is exact (one matrix-vector product) below LOCAL_HNSW_MIN_POINTS
+    live points; above it, an hnswlib graph is used when hnswlib is
+    installed. The graph is saved next to the vectors (hnsw.bin) with the
+    sequence number it covers and caught up from the change log on load.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._vec_path = os.path.join(root, "vectors.f32")
+        self._hnsw_path = os.path.join(root, "hnsw.bin")
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS points (slot INTEGER PRIMARY KEY, point_id TEXT UNIQUE NOT NULL, "
+            "doc_id TEXT NOT NULL, seq INTEGER NOT NULL, payload TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS points_doc_id ON points (doc_id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS points_seq ON points (seq)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS tombstones (slot INTEGER PRIMARY KEY, seq INTEGER NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS tombstones_seq ON tombstones (seq)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._db.commit()
+
+        self.dim = None
+        self._vectors = None
+        self._seq = 0
+        self._payloads: dict[int, dict] = {}
+        self._slot_seq: dict[int, int] = {}
+        self._alive = None  # sorted array of live slots, rebuilt lazily
+        self._hnsw = None
+        self._hnsw_saved_seq = 0
+        self.refresh()
+
+    # --- storage -----------------------------------------------------------
+
+    def _meta(self, cur, key: str, default=None):
+        row = cur.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, cur, key: str, value: int):
+        cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, int(value)))
+
+    def _map(self, dim: int, rows: int):
+        """(Re)maps the vector file when it is new or has grown past the current mapping."""
+        if dim is None:
+            return
+        capacity = os.path.getsize(self._vec_path) // (dim * 4) if os.path.exists(self._vec_path) else 0
+        if self._vectors is None or self._vectors.shape[0] != capacity:
+            if capacity < max(rows, 1):
+                return
+            self._vectors = np.memmap(self._vec_path, dtype=np.float32, mode="r+", shape=(capacity, dim))
+        self.dim = dim
+
+    def _ensure_capacity(self, dim: int, rows: int):
+        capacity = os.path.getsize(self._vec_path) // (dim * 4) if os.path.exists(self._vec_path) else 0
+        if capacity >= rows:
+            self._map(dim, rows)
+            return
+        new_capacity = max(1024, capacity * 2, rows)
+        with open(self._vec_path, "ab") as f:
+            f.truncate(new_capacity * dim * 4)  # sparse on Linux
+        self._vectors = None
+        self._map(dim, rows)
+
+    def refresh(self):
+        """Applies writes made since the last refresh (by any process) to the in-memory state."""
+        with self._lock:
+            cur = self._db.cursor()
+            seq = self._meta(cur, "seq", 0)
+            if seq == self._seq and self._vectors is not None:
+                return
+            dim = self._meta(cur, "dim")
+            self._map(dim, self._meta(cur, "next_slot", 0))
+            changed, dead = [], []
+            for slot, s, payload in cur.execute(
+                "SELECT slot, seq, payload FROM points WHERE seq > ?", (self._seq,)
+            ):
+                if self._slot_seq.get(slot, -1) < s:
+                    self._payloads[slot] = json.loads(payload)
+                    self._slot_seq[slot] = s
+                    changed.append(slot)
+            for slot, s in cur.execute("SELECT slot, seq FROM tombstones WHERE seq > ?", (self._seq,)):
+                if self._slot_seq.get(slot, -1) < s:
+                    self._payloads.pop(slot, None)
+                    self._slot_seq[slot] = s
+                    dead.append(slot)
+            self._seq = seq
+            if changed or dead:
+                self._alive = None
+                if self._hnsw is not None:
+                    self._hnsw_apply(changed, dead)
+
+    def upsert(self, point_ids: List[str], doc_ids: List[str], payloads: List[dict], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(point_ids):
+            return
+        # Stored normalized so a dot product is the cosine similarity (as with Qdrant's Cosine distance)
+        vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        with self._lock:
+            cur = self._db.cursor()
+            cur.execute("BEGIN IMMEDIATE")  # serialises slot allocation across processes
+            try:
+                dim = self._meta(cur, "dim")
+                if dim is None:
+                    dim = vectors.shape[1]
+                    self._set_meta(cur, "dim", dim)
+                elif dim != vectors.shape[1]:
+                    raise ValueError(f"Vector size {vectors.shape[1]} does not match the local index ({dim})")
+                seq = self._meta(cur, "seq", 0)
+                next_slot = self._meta(cur, "next_slot", 0)
+                rows = []
+                for pid, did, payload in zip(point_ids, doc_ids, payloads):
+                    row = cur.execute("SELECT slot FROM points WHERE point_id = ?", (pid,)).fetchone()
+                    if row:
+                        slot = row[0]
+                    else:
+                        free = cur.execute("SELECT slot FROM tombstones ORDER BY slot LIMIT 1").fetchone()
+                        if free:
+                            slot = free[0]
+                            cur.execute("DELETE FROM tombstones WHERE slot = ?", (slot,))
+                        else:
+                            slot, next_slot = next_slot, next_slot + 1
+                    seq += 1
+                    rows.append((slot, pid, did, seq, json.dumps(payload)))
+                self._ensure_capacity(dim, next_slot)
+                slots = np.array([r[0] for r in rows])
+                self._vectors[slots] = vectors
+                self._vectors.flush()
+                cur.executemany(
+                    "INSERT OR REPLACE INTO points (slot, point_id, doc_id, seq, payload) VALUES (?, ?, ?, ?, ?)", rows
+                )
+                self._set_meta(cur, "seq", seq)
+                self._set_meta(cur, "next_slot", next_slot)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        self.refresh()
+
+    def _write_payloads(self, where: str, params: list, update):
+        with self._lock:
+            cur = self._db.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                seq = self._meta(cur, "seq", 0)
+                rows = cur.execute(f"SELECT slot, payload FROM points WHERE {where}", params).fetchall()
+                out = []
+                for slot, payload in rows:
+                    seq += 1
+                    out.append((seq, json.dumps(update(json.loads(payload))), slot))
+                cur.executemany("UPDATE points SET seq = ?, payload = ? WHERE slot = ?", out)
+                self._set_meta(cur, "seq", seq)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        self.refresh()
+
+    def set_payload(self, doc_id: str, payload: dict):
+        self._write_payloads("doc_id = ?", [doc_id], lambda p: {**p, **payload})
+
+    def delete_documents(self, doc_ids: List[str]):
+        self._delete("doc_id", doc_ids)
+
+    def delete_points(self, point_ids: List[str]):
+        self._delete("point_id", point_ids)
+
+    def _delete(self, column: str, values: List[str]):
+        with self._lock:
+            cur = self._db.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                seq = self._meta(cur, "seq", 0)
+                for start in range(0, len(values), 500):
+                    part = list(values[start:start + 500])
+                    marks = ",".join("?" * len(part))
+                    slots = [s for (s,) in cur.execute(f"SELECT slot FROM points WHERE {column} IN ({marks})", part)]
+                    tombs = []
+                    for slot in slots:
+                        seq += 1
+                        tombs.append((slot, seq))
+                    cur.executemany("INSERT OR REPLACE INTO tombstones (slot, seq) VALUES (?, ?)", tombs)
+                    cur.execute(f"DELETE FROM points WHERE {column} IN ({marks})", part)
+                self._set_meta(cur, "seq", seq)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        self.refresh()
+
+    def document_points(self, doc_id: str) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT point_id, payload FROM points WHERE doc_id = ?", (doc_id,)).fetchall()
+        out = {}
+        for pid, payload in rows:
+            p = json.loads(payload)
+            out[pid] = (p.get("page_start"), p.get("page_end"))
+        return out
+
+    def iter_doc_id_batches(self, batch_size: int = 1000):
+        last = ""
+        while True:
+            with self._lock:
+                ids = [d for (d,) in self._db.execute(
+                    "SELECT DISTINCT doc_id FROM points WHERE doc_id > ? ORDER BY doc_id LIMIT ?", (last, batch_size)
+                )]
+            if not ids:
+                break
+            yield set(ids)
+            last = ids[-1]
+
+    # --- search ------------------------------------------------------------
+
+    def _alive_slots(self) -> np.ndarray:
+        if self._alive is None:
+            self._alive = np.array(sorted(self._payloads), dtype=np.int64)
+        return self._alive
+
+    def _filtered_slots(self, flt: qm.Filter | None) -> np.ndarray:
+        alive = self._alive_slots()
+        if flt is None:
+            return alive
+        return np.array([s for s in alive if filter_matches(self._payloads[s], flt)], dtype=np.int64)
+
+    def _use_hnsw(self) -> bool:
+        if len(self._payloads) < settings.LOCAL_HNSW_MIN_POINTS:
+            return False
+        if self._hnsw is None:
+            try:
+                import hnswlib  # noqa: F401
+            except ImportError:
+                global _hnswlib_warned
+                if not _hnswlib_warned:
+                    _hnswlib_warned = True
+                    print(
+                        f"Local index has {len(self._payloads)} points (LOCAL_HNSW_MIN_POINTS="
+                        f"{settings.LOCAL_HNSW_MIN_POINTS}) but hnswlib is not installed; searching exactly"
+                    )
+                return False
+            self._hnsw_open()
+        return True
+
+    def _hnsw_open(self):
+        import hnswlib
+        capacity = self._vectors.shape[0]
+        index = hnswlib.Index(space="ip", dim=self.dim)
+        meta_path = self._hnsw_path + ".json"
+        saved = None
+        if os.path.exists(self._hnsw_path) and os.path.exists(meta_path):
+            with open(meta_path) as f:
+                saved = json.load(f)
+        if saved and saved.get("dim") == self.dim and saved.get("seq", 0) <= self._seq:
+            index.load_index(self._hnsw_path, max_elements=capacity)
+            self._hnsw = index
+            self._hnsw_saved_seq = saved["seq"]
+            # Catch up with writes made after the graph was saved
+            changed = [s for s, q in self._slot_seq.items() if q > saved["seq"] and s in self._payloads]
+            dead = [s for s, q in self._slot_seq.items() if q > saved["seq"] and s not in self._payloads]
+            self._hnsw_apply(changed, dead)
+        else:
+            index.init_index(
+                max_elements=capacity, M=settings.LOCAL_HNSW_M,
+                ef_construction=settings.LOCAL_HNSW_EF_CONSTRUCTION,
+            )
+            alive = self._alive_slots()
+            index.add_items(np.asarray(self._vectors[alive]), alive)
+            self._hnsw = index
+            self._hnsw_save()
+        self._hnsw.set_ef(settings.LOCAL_HNSW_EF)
+
+    def _hnsw_apply(self, changed: List[int], dead: List[int]):
+        if self._vectors.shape[0] > self._hnsw.get_max_elements():
+            self._hnsw.resize_index(self._vectors.shape[0])
+        if changed:
+            slots = np.array(changed, dtype=np.int64)
+            self._hnsw.add_items(np.asarray(self._vectors[slots]), slots)
+        for slot in dead:
+            try:
+                self._hnsw.mark_deleted(slot)
+            except RuntimeError:
+                pass  # never added (or already deleted)
+        if self._seq - self._hnsw_saved_seq >= settings.LOCAL_HNSW_SAVE_EVERY:
+            self._hnsw_save()
+
+    def _hnsw_save(self):
+        tmp = f"{self._hnsw_path}.{os.getpid()}.tmp"
+        self._hnsw.save_index(tmp)
+        os.replace(tmp, self._hnsw_path)
+        with open(tmp + ".json", "w") as f:
+            json.dump({"seq": self._seq, "dim": self.dim}, f)
+        os.replace(tmp + ".json", self._hnsw_path + ".json")
+        self._hnsw_saved_seq = self._seq
+
+    def ranked(self, query_vec, limit: int, flt: qm.Filter | None = None) -> List[tuple]:
+        """Top `limit` (slot, score) pairs by cosine similarity, best first, restricted to `flt`."""
+        self.refresh()
+        with self._lock:
+            if self._vectors is None or not self._payloads or limit <= 0:
+                return []
+            q = np.asarray(query_vec, dtype=np.float32).reshape(-1)
+            q = q / max(float(np.linalg.norm(q)), 1e-12)
+            if self._use_hnsw():
+                n = len(self._payloads)
+                check = (lambda slot: filter_matches(self._payloads.get(slot, {}), flt)) if flt is not None else None
+                self._hnsw.set_ef(max(settings.LOCAL_HNSW_EF, limit))
+                try:
+                    labels, dists = self._hnsw.knn_query(q, k=min(limit, n), filter=check)
+                except RuntimeError:
+                    # Fewer than `limit` points pass the filter
+                    return self._exact(q, limit, flt)
+                return [(int(s), 1.0 - float(d)) for s, d in zip(labels[0], dists[0])]
+            return self._exact(q, limit, flt)
+
+    def _exact(self, q: np.ndarray, limit: int, flt: qm.Filter | None) -> List[tuple]:
+        slots = self._filtered_slots(flt)
+        if not len(slots):
+            return []
+        scores = np.asarray(self._vectors[slots]) @ q
+        top = np.argpartition(-scores, limit - 1)[:limit] if limit < len(slots) else np.arange(len(slots))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(slots[i]), float(scores[i])) for i in top]
+
+    def point(self, slot: int, score: float) -> qm.ScoredPoint:
+        payload = self._payloads.get(slot, {})
+        return qm.ScoredPoint(
+            id=payload.get("chunk_id") or slot, version=self._slot_seq.get(slot, 0), score=score, payload=payload,
+        )
+
+    def stats(self) -> dict:
+        return {
+            "points": len(self._payloads),
+            "dim": self.dim,
+            "hnsw": self._hnsw is not None,
+        }
+
+
+class _LocalWriter:
+    """Writes to the local index are synchronous; flush() only exists for VectorStore compatibility."""
+
+    def __init__(self):
+        self.batches = 0
+
+    def flush(self):
+        pass
+
+
+class LocalVectorStore:
+    """
+    Drop-in for the Qdrant VectorStore (VECTOR_BACKEND=local): same methods,
+    payloads, filters (the Qdrant Filter models from build_filter) and hit
+    objects, backed by a LocalIndex under LOCAL_INDEX_DIR/<collection>.
+    Dense search only; sparse/hybrid requests fall back to dense as they do
+    on a Qdrant collection without sparse vectors.
+    """
+
+    _indexes: dict = {}
+    _pid = None
+    _lock = threading.Lock()
+
+    build_filter = staticmethod(QdrantVectorStore.build_filter)
+
+    def __init__(self):
+        # Versioned like the Qdrant collections, so a model/chunking change starts a fresh index
+        self.collection = collection_version_name() if settings.COLLECTION_VERSIONING else settings.COLLECTION_NAME
+        self.sparse = False
+        with LocalVectorStore._lock:
+            if LocalVectorStore._pid != os.getpid():
+                LocalVectorStore._indexes = {}
+                LocalVectorStore._pid = os.getpid()
+            if self.collection not in LocalVectorStore._indexes:
+                slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", self.collection)
+                LocalVectorStore._indexes[self.collection] = LocalIndex(os.path.join(settings.LOCAL_INDEX_DIR, slug))
+            self.index = LocalVectorStore._indexes[self.collection]
+
+    def writer(self) -> _LocalWriter:
+        return _LocalWriter()
+
+    def upsert_chunks(self, doc_id: str, chunks, vectors, meta: dict | None = None, writer=None):
+        chunks = list(chunks)
+        self.index.upsert(
+            [c.chunk_id for c in chunks],
+            [doc_id] * len(chunks),
+            [QdrantVectorStore._payload(doc_id, c, meta) for c in chunks],
+            vectors,
+        )
+        if writer is not None:
+            writer.batches += 1
+
+    def set_document_payload(self, doc_id: str, payload: dict):
+        self.index.set_payload(doc_id, payload)
+
+    def delete_document(self, doc_id: str):
+        self.delete_documents([doc_id])
+
+    def delete_documents(self, doc_ids: List[str], batch_size: int = 1000):
+        self.index.delete_documents(list(doc_ids))
+
+    def document_chunks(self, doc_id: str, batch_size: int = 1000) -> dict:
+        return self.index.document_points(doc_id)
+
+    def delete_points(self, point_ids: List[str], batch_size: int = 1000):
+        self.index.delete_points(list(point_ids))
+
+    def iter_doc_id_batches(self, batch_size: int = 1000):
+        return self.index.iter_doc_id_batches(batch_size)
+
+    def search(
+        self, query_vec, k: int = 10, query_text: str | None = None, mode: str = "dense",
+        query_filter: qm.Filter | None = None,
+    ):
+        return [self.index.point(s, score) for s, score in self.index.ranked(query_vec, k, query_filter)]
+
+    def search_batch(
+        self, query_vecs, query_texts: List[str], k: int = 10, mode: str = "dense",
+        query_filter: qm.Filter | None = None,
+    ) -> list:
+        return [self.search(v, k, query_filter=query_filter) for v in query_vecs]
+
+    def search_groups(
+        self, query_vec, query_text: str | None = None, groups: int = 5, group_size: int = 3,
+        mode: str = "dense", query_filter: qm.Filter | None = None, dedupe: bool = False,
+    ) -> list:
+        # Enough candidates that `groups` documents are usually covered; exact search ranks everything anyway
+        ranked = self.index.ranked(query_vec, max(groups * group_size * 10, 100), query_filter)
+        by_doc: dict[str, list] = {}
+        for slot, score in ranked:
+            hit = self.index.point(slot, score)
+            doc_id = (hit.payload or {}).get("doc_id")
+            if doc_id not in by_doc:
+                if len(by_doc) >= groups:
+                    continue
+                by_doc[doc_id] = []
+            by_doc[doc_id].append(hit)
+        out = []
+        for doc_id, hits in by_doc.items():
+            hits = QdrantVectorStore._drop_overlapping(hits) if dedupe else hits
+            out.append((doc_id, hits[:group_size]))
+        return out
+
+    def stats(self) -> dict:
+        return {"backend": "local", **self.index.stats()}
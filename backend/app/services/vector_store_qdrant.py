@@ -1,103 +1,708 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as qm
+from tenacity import retry, stop_after_attempt, wait_exponential
 from app.core.config import settings
+from app.services import sparse_vectors
+from app.services.chunking import chunker_version
 from typing import List
-import uuid
+import numpy as np
+
+
+# Searches retry briefly, e.g. across the one-time switch from an unversioned collection to the alias
+_read_retry = retry(wait=wait_exponential(multiplier=0.2, max=2), stop=stop_after_attempt(3), reraise=True)
+
+# How long a process trusts its view of the COLLECTION_NAME alias before looking it up again
+ALIAS_CHECK_SECONDS = 30
+
+# Named sparse vector holding BM25 term weights; the dense vector stays the unnamed default
+SPARSE_VECTOR = "bm25"
+
+# Indexed payload fields usable in search filters
+PAYLOAD_INDEXES = {
+    "doc_id": qm.PayloadSchemaType.KEYWORD,
+    "lang": qm.PayloadSchemaType.KEYWORD,
+    "classification": qm.PayloadSchemaType.KEYWORD,
+    "mime_type": qm.PayloadSchemaType.KEYWORD,
+    "uploaded_at": qm.PayloadSchemaType.DATETIME,
+}
+
+def collection_version_name() -> str:
+    """
+    Physical collection for the current embedding model, vector size and
+    chunking config: <COLLECTION_NAME>__<hash>. COLLECTION_NAME itself is a
+    Qdrant alias pointing at the live version. Every process reads and
+    writes the version of its own config (see VectorStore).
+    """
+    key = json.dumps({
+        "model": settings.EMBEDDING_MODEL,
+        "dim": settings.EMBEDDING_DIM,
+        "chunk_max_tokens": settings.CHUNK_MAX_TOKENS,
+        "chunk_overlap_tokens": settings.CHUNK_OVERLAP_TOKENS,
+        "chunker": chunker_version(),
+    }, sort_keys=True)
+    return f"{settings.COLLECTION_NAME}__{hashlib.sha1(key.encode()).hexdigest()[:10]}"
+
+
+class UpsertWriter:
+    """
+    Pipelines upsert batches for one indexing run. Up to
+    QDRANT_UPSERT_CONCURRENCY batches are in flight at once, sent with
+    wait=False (Qdrant acknowledges once the update is queued). The most
+    recent batch is held back and sent with wait=True by flush(); Qdrant
+    applies updates in order, so when flush() returns every batch is applied
+    and searchable. Each batch is retried on its own (QDRANT_UPSERT_RETRIES).
+    """
+
+    _executor = None
+    _executor_pid = None
+    _lock = threading.Lock()
+
+    def __init__(self, store: "VectorStore"):
+        self.store = store
+        self.max_in_flight = max(1, settings.QDRANT_UPSERT_CONCURRENCY)
+        self._in_flight: "deque[Future]" = deque()
+        self._held: qm.Batch | None = None
+        self.batches = 0
+
+    @classmethod
+    def executor(cls) -> ThreadPoolExecutor:
+        if cls._executor is None or cls._executor_pid != os.getpid():
+            with cls._lock:
+                if cls._executor is None or cls._executor_pid != os.getpid():
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=max(1, settings.QDRANT_UPSERT_CONCURRENCY), thread_name_prefix="qdrant-upsert",
+                    )
+                    cls._executor_pid = os.getpid()
+        return cls._executor
+
+    @retry(
+        wait=wait_exponential(multiplier=0.5, min=0.5, max=10),
+        stop=stop_after_attempt(max(1, settings.QDRANT_UPSERT_RETRIES)),
+        reraise=True,
+    )
+    def _send(self, batch: qm.Batch, wait: bool):
+        # Point ids are deterministic, so resending a batch is harmless
+        self.store.client.upsert(collection_name=self.store.collection, points=batch, wait=wait)
+
+    def add(self, batch: qm.Batch):
+        if self._held is not None:
+            while len(self._in_flight) >= self.max_in_flight:
+                self._in_flight.popleft().result()
+            self._in_flight.append(self.executor().submit(self._send, self._held, False))
+        self._held = batch
+        self.batches += 1
+
+    def flush(self):
+        """Consistency barrier: waits for every in-flight batch, then sends the last one with wait=True."""
+        error = None
+        while self._in_flight:
+            try:
+                self._in_flight.popleft().result()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            self._held = None
+            raise error
+        if self._held is not None:
+            batch, self._held = self._held, None
+            self._send(batch, True)
+
 
 class VectorStore:
-    def __init__(self):
-        self.client = QdrantClient(
-            url=settings.QDRANT_URL,
-            api_key=settings.QDRANT_API_KEY,
-            timeout=settings.QDRANT_TIMEOUT
-        )
-        self.collection = settings.COLLECTION_NAME
-        self._ensure_collection_and_indexes()
+    # One client per process (its HTTP/gRPC connections are reused by every
+    # VectorStore), and collection setup runs once per process and collection.
+    _client = None
+    _client_pid = None
+    _lock = threading.Lock()
+    _ready: dict = {}  # collection -> has sparse vectors
+    _route = None  # (checked at, collection, alias target, read error)
+
+    def __init__(self, collection: str | None = None):
+        """
+        Reads and writes go to the collection of this process's own
+        model/chunking config (collection_version_name()), which is the one
+        the COLLECTION_NAME alias points at once scripts.reindex_collection
+        has switched it. A process still on an old config after a switch
+        therefore keeps using its old version instead of overwriting or
+        querying vectors of another model; searches fail loudly when its
+        version is missing or empty (see _resolve). `collection` targets one
+        physical collection instead: the version rebuild_collection fills.
+        """
+        self.client = VectorStore.get_client()
+        self.alias = settings.COLLECTION_NAME
+        with VectorStore._lock:
+            if collection is not None:
+                self.collection, self.read_error = collection, None
+            else:
+                self.collection, self.read_error = self._resolve()
+            if self.collection not in VectorStore._ready:
+                self.sparse = False
+                self._ensure_collection_and_indexes()
+                VectorStore._ready[self.collection] = self.sparse
+        self.sparse = VectorStore._ready[self.collection]
+
+    @classmethod
+    def get_client(cls) -> QdrantClient:
+        """
+        Process-wide Qdrant client; recreated after a fork (Celery prefork
+        children) because connections, and gRPC channels in particular,
+        must not be shared across processes.
+        """
+        if cls._client is None or cls._client_pid != os.getpid():
+            with cls._lock:
+                if cls._client is None or cls._client_pid != os.getpid():
+                    cls._client = QdrantClient(
+                        url=settings.QDRANT_URL,
+                        api_key=settings.QDRANT_API_KEY,
+                        timeout=settings.QDRANT_TIMEOUT,
+                        prefer_grpc=settings.QDRANT_PREFER_GRPC,
+                        grpc_port=settings.QDRANT_GRPC_PORT,
+                    )
+                    cls._client_pid = os.getpid()
+                    cls._ready = {}
+                    cls._route = None
+        return cls._client
+
+    def _resolve(self) -> tuple:
+        """
+        (collection, read error) for this process, re-checked every
+        ALIAS_CHECK_SECONDS so a switch of the alias is noticed: its own
+        version, or the unversioned collection still holding the alias name
+        before the first re-index. The read error is set while the alias
+        points at another version and the own version is missing or empty.
+        """
+        if not settings.COLLECTION_VERSIONING:
+            return self.alias, None
+        route = VectorStore._route
+        if route is not None and time.monotonic() - route[0] < ALIAS_CHECK_SECONDS:
+            return route[1], route[3]
+        own = collection_version_name()
+        target = self.alias_target()
+        error = None
+        if target is None and self.client.collection_exists(self.alias):
+            collection = self.alias
+            message = (
+                f"Using unversioned collection '{self.alias}'; scripts.reindex_collection migrates it to "
+                f"'{own}' behind an alias"
+            )
+        elif target is None:
+            # Fresh install: the first version goes live straight away
+            collection = own
+            if not self.client.collection_exists(own):
+                self.create_collection(own)
+            self.switch_alias(own)
+            target = own
+            message = None
+        else:
+            collection = own
+            message = None
+            if target != own:
+                if not self.client.collection_exists(own) or not self.client.count(own, exact=False).count:
+                    error = (
+                        f"No indexed collection '{own}' for this process's embedding/chunking config ('{self.alias}' "
+                        f"points at '{target}'); run scripts.reindex_collection with these settings"
+                    )
+                    message = error
+                else:
+                    message = (
+                        f"'{self.alias}' points at '{target}', built for a different embedding/chunking config; "
+                        f"this process keeps using '{own}'"
+                    )
+        if route is None or route[1:] != (collection, target, error):
+            if message:
+                print(message)
+        VectorStore._route = (time.monotonic(), collection, target, error)
+        return collection, error
+
+    def _check_readable(self):
+        if self.read_error:
+            raise RuntimeError(self.read_error)
 
     def _ensure_collection_and_indexes(self):
-        # Create collection if missing
-        try:
-            self.client.get_collection(self.collection)
-        except Exception:
-            self.client.recreate_collection(
-                collection_name=self.collection,
-                vectors_config=qm.VectorParams(size=768, distance=qm.Distance.COSINE),
+        # Create collection if missing (lookup errors propagate; an existing index is never recreated)
+        if self.client.collection_exists(self.collection):
+            self._sync_collection_config(self.collection, self.client.get_collection(self.collection))
+        else:
+            self.create_collection(self.collection)
+            self.sparse = settings.SPARSE_VECTORS_ENABLED
+        # Ensure payload indexes for filtering (applied inside the HNSW search, not after it)
+        for field, schema in PAYLOAD_INDEXES.items():
+            try:
+                self.client.create_payload_index(
+                    collection_name=self.collection,
+                    field_name=field,
+                    field_schema=schema,
+                )
+            except Exception:
+                # Index might already exist — ignore
+                pass
+
+    def _is_physical(self, name: str) -> bool:
+        return any(c.name == name for c in self.client.get_collections().collections)
+
+    def alias_target(self) -> str | None:
+        for a in self.client.get_aliases().aliases:
+            if a.alias_name == self.alias:
+                return a.collection_name
+        return None
+
+    def list_versions(self) -> List[str]:
+        prefix = f"{self.alias}__"
+        return sorted(c.name for c in self.client.get_collections().collections if c.name.startswith(prefix))
+
+    def create_collection(self, name: str):
+        self.client.create_collection(
+            collection_name=name,
+            vectors_config=qm.VectorParams(
+                size=settings.EMBEDDING_DIM, distance=qm.Distance.COSINE, on_disk=settings.QDRANT_VECTORS_ON_DISK,
+            ),
+            hnsw_config=self._hnsw_config(),
+            quantization_config=self._quantization_config(),
+            on_disk_payload=settings.QDRANT_PAYLOAD_ON_DISK,
+            sparse_vectors_config=self._sparse_config() or None,
+        )
+        for field, schema in PAYLOAD_INDEXES.items():
+            self.client.create_payload_index(collection_name=name, field_name=field, field_schema=schema)
+
+    def copy_collection(self, source: str, target: str, batch_size: int = 256) -> int:
+        """Copies every point (vectors and payload) of `source` into a new collection `target` with its config."""
+        params = self.client.get_collection(source).config.params
+        self.client.create_collection(
+            collection_name=target,
+            vectors_config=params.vectors,
+            sparse_vectors_config=params.sparse_vectors,
+            hnsw_config=self._hnsw_config(),
+            quantization_config=self._quantization_config(),
+            on_disk_payload=settings.QDRANT_PAYLOAD_ON_DISK,
+        )
+        for field, schema in PAYLOAD_INDEXES.items():
+            self.client.create_payload_index(collection_name=target, field_name=field, field_schema=schema)
+        copied, offset = 0, None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=source, limit=batch_size, offset=offset, with_payload=True, with_vectors=True,
             )
-        # Ensure payload index on doc_id for filtering
+            if points:
+                self.client.upsert(
+                    collection_name=target,
+                    points=[qm.PointStruct(id=p.id, vector=p.vector, payload=p.payload) for p in points],
+                    wait=True,
+                )
+                copied += len(points)
+            if offset is None:
+                break
+        return copied
+
+    def switch_alias(self, collection: str, keep_legacy: bool = True):
+        """
+        Points the alias at `collection` in one atomic alias update, so
+        alias readers move from the old version to the new one without a gap.
+
+        A pre-versioning collection still holding the alias name is first
+        copied to <alias>__legacy (unless keep_legacy is False), then dropped
+        right before the alias update, since Qdrant cannot alias a name a
+        collection holds. That one-time migration leaves a gap of a single
+        request, which reads and upserts ride out through their retries.
+        """
+        if self._is_physical(self.alias):
+            if keep_legacy:
+                backup = f"{self.alias}__legacy"
+                n = self.copy_collection(self.alias, backup)
+                print(f"Copied {n} points of unversioned collection '{self.alias}' to '{backup}'")
+            self.client.delete_collection(self.alias)
+        ops = []
+        if self.alias_target() is not None:
+            ops.append(qm.DeleteAliasOperation(delete_alias=qm.DeleteAlias(alias_name=self.alias)))
+        ops.append(qm.CreateAliasOperation(create_alias=qm.CreateAlias(collection_name=collection, alias_name=self.alias)))
+        self.client.update_collection_aliases(change_aliases_operations=ops)
+        print(f"Alias '{self.alias}' now points at '{collection}'")
+
+    @staticmethod
+    def _hnsw_config() -> qm.HnswConfigDiff:
+        return qm.HnswConfigDiff(
+            m=settings.QDRANT_HNSW_M,
+            ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT,
+            on_disk=settings.QDRANT_HNSW_ON_DISK,
+        )
+
+    @staticmethod
+    def _quantization_config():
+        mode = settings.QDRANT_QUANTIZATION
+        if mode == "scalar":
+            return qm.ScalarQuantization(scalar=qm.ScalarQuantizationConfig(
+                type=qm.ScalarType.INT8, quantile=0.99, always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM,
+            ))
+        if mode == "binary":
+            return qm.BinaryQuantization(binary=qm.BinaryQuantizationConfig(
+                always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM,
+            ))
+        if mode not in ("", "none"):
+            print(f"Unknown QDRANT_QUANTIZATION={mode!r}; storing unquantized vectors")
+        return None
+
+    @staticmethod
+    def _quantization_matches(live, want) -> bool:
+        """True when the live quantization has the same kind and the same values for every field we configure."""
+        if type(live) is not type(want):
+            return False
+        if want is None:
+            return True
+        kind = "scalar" if isinstance(want, qm.ScalarQuantization) else "binary"
+        live_cfg = getattr(live, kind)
+        for field, value in getattr(want, kind).model_dump(exclude_none=True).items():
+            current = getattr(live_cfg, field, None)
+            if field == "always_ram":
+                current = bool(current)
+            if current != value:
+                return False
+        return True
+
+    @staticmethod
+    def _sparse_config() -> dict:
+        if not settings.SPARSE_VECTORS_ENABLED:
+            return {}
+        # IDF is computed by Qdrant from the collection, so documents only carry BM25 tf weights
+        return {SPARSE_VECTOR: qm.SparseVectorParams(modifier=qm.Modifier.IDF)}
+
+    def _sync_collection_config(self, name: str, info):
+        """
+        Applies changed HNSW / quantization / on-disk settings to an existing
+        collection. Qdrant rebuilds the affected segments in the background;
+        nothing is sent when the live config already matches.
+        """
+        cfg = info.config
+        update = {}
+        hnsw = cfg.hnsw_config
+        if (hnsw.m, hnsw.ef_construct, bool(hnsw.on_disk)) != (
+            settings.QDRANT_HNSW_M, settings.QDRANT_HNSW_EF_CONSTRUCT, settings.QDRANT_HNSW_ON_DISK,
+        ):
+            update["hnsw_config"] = self._hnsw_config()
+        want_q = self._quantization_config()
+        if not self._quantization_matches(cfg.quantization_config, want_q):
+            update["quantization_config"] = want_q if want_q is not None else qm.Disabled.DISABLED
+        vectors = cfg.params.vectors
+        if isinstance(vectors, qm.VectorParams) and bool(vectors.on_disk) != settings.QDRANT_VECTORS_ON_DISK:
+            update["vectors_config"] = {"": qm.VectorParamsDiff(on_disk=settings.QDRANT_VECTORS_ON_DISK)}
+        if bool(cfg.params.on_disk_payload) != settings.QDRANT_PAYLOAD_ON_DISK:
+            update["collection_params"] = qm.CollectionParamsDiff(on_disk_payload=settings.QDRANT_PAYLOAD_ON_DISK)
+        # One request per change, so a change the server rejects does not block the others
+        for key, value in update.items():
+            try:
+                self.client.update_collection(collection_name=name, **{key: value})
+            except Exception as e:
+                print(f"Could not update {key} of Qdrant collection '{name}': {e}")
+                continue
+            print(f"Updated {key} of Qdrant collection '{name}'")
+        self.sparse = settings.SPARSE_VECTORS_ENABLED and (
+            SPARSE_VECTOR in (cfg.params.sparse_vectors or {}) or self._add_sparse_vector(name)
+        )
+
+    def _add_sparse_vector(self, name: str) -> bool:
+        """
+        Adds the BM25 sparse vector to an existing collection (update_collection
+        cannot add vector names). Points indexed before this need a re-index to
+        gain sparse vectors. Returns False, with a warning, when the server
+        cannot add it; search then stays dense-only on this collection.
+        """
         try:
-            self.client.create_payload_index(
-                collection_name=self.collection,
-                field_name="doc_id",
-                field_schema=qm.PayloadSchemaType.KEYWORD,
+            self.client.create_vector_name(
+                collection_name=name,
+                vector_name=SPARSE_VECTOR,
+                vector_name_config=qm.SparseVectorNameConfig(sparse=qm.SparseVectorConfig(modifier=qm.Modifier.IDF)),
+            )
+        except Exception as e:
+            print(
+                f"Could not add sparse vector '{SPARSE_VECTOR}' to Qdrant collection '{name}' ({e}); sparse and "
+                f"hybrid searches fall back to dense until scripts.reindex_collection builds a new collection"
             )
-        except Exception:
-            # Index might already exist — ignore
-            pass
+            return False
+        print(f"Added sparse vector '{SPARSE_VECTOR}' to Qdrant collection '{name}'")
+        return True
 
-    def upsert_chunks(self, doc_id: str, chunks, vectors: List):
+    @staticmethod
+    def search_params() -> qm.SearchParams:
+        """
+        Search-time knobs matching the collection config: HNSW ef and, when
+        vectors are quantized, rescoring of an oversampled candidate set
+        against the original float32 vectors.
+        """
+        quantization = None
+        if settings.QDRANT_QUANTIZATION in ("scalar", "binary"):
+            quantization = qm.QuantizationSearchParams(
+                rescore=settings.QDRANT_SEARCH_RESCORE,
+                oversampling=settings.QDRANT_SEARCH_OVERSAMPLING,
+            )
+        return qm.SearchParams(hnsw_ef=settings.QDRANT_SEARCH_EF or None, quantization=quantization)
+
+    def writer(self) -> UpsertWriter:
+        return UpsertWriter(self)
+
+    def upsert_chunks(self, doc_id: str, chunks, vectors, meta: dict | None = None, writer: UpsertWriter | None = None):
+        """
+        Upserts chunks with their embeddings as columnar Batch payloads.
+        `vectors` is the (n, dim) float32 matrix from EmbeddingService.embed_chunks;
+        each batch is a slice of it converted in one call, with no per-point objects.
+        `meta` holds document-level filter fields (mime_type, uploaded_at,
+        classification) copied into every chunk payload.
+        Batches are pipelined through `writer`; callers passing one must call
+        writer.flush() when done. Without it, the call flushes before returning.
+        """
+        own_writer = writer is None
+        writer = writer or self.writer()
+        chunks = list(chunks)
+        vectors = np.asarray(vectors, dtype=np.float32)
         bs = max(1, settings.QDRANT_BATCH_SIZE)
-        acc: List[qm.PointStruct] = []
-        for c, v in zip(chunks, vectors):
-            pid = str(uuid.uuid4())
-            payload = {
-                "doc_id": doc_id,
-                "chunk_id": c.chunk_id,
-                "page_start": c.page_start,
-                "page_end": c.page_end,
-                "text_snippet": c.text[: settings.TEXT_SNIPPET_CHARS],
-            }
-            acc.append(qm.PointStruct(id=pid, vector=v.tolist(), payload=payload))
-            if len(acc) >= bs:
-                self.client.upsert(collection_name=self.collection, points=acc)
-                acc = []
-        if acc:
-            self.client.upsert(collection_name=self.collection, points=acc)
+        for start in range(0, len(chunks), bs):
+            part = chunks[start:start + bs]
+            dense = vectors[start:start + len(part)].tolist()
+            writer.add(qm.Batch(
+                # Point id == chunk id (deterministic), so re-indexing a document is an upsert
+                ids=[c.chunk_id for c in part],
+                vectors={"": dense, SPARSE_VECTOR: [self._sparse(c.text) for c in part]} if self.sparse else dense,
+                payloads=[self._payload(doc_id, c, meta) for c in part],
+            ))
+        if own_writer:
+            writer.flush()
+
+    @staticmethod
+    def _sparse(text: str, query: bool = False) -> qm.SparseVector:
+        indices, values = (sparse_vectors.encode_query if query else sparse_vectors.encode_document)(text)
+        return qm.SparseVector(indices=indices, values=values)
+
+    @staticmethod
+    def _payload(doc_id: str, c, meta: dict | None = None) -> dict:
+        payload = {
+            "doc_id": doc_id,
+            "chunk_id": c.chunk_id,
+            "page_start": c.page_start,
+            "page_end": c.page_end,
+            "lang": c.lang,
+            "text_snippet": c.text[: settings.TEXT_SNIPPET_CHARS],
+        }
+        if meta:
+            payload.update({k: v for k, v in meta.items() if v is not None})
+        return payload
+
+    def set_document_payload(self, doc_id: str, payload: dict):
+        """Sets fields on every chunk of a document (e.g. its classification once the LLM has run)."""
+        self.client.set_payload(
+            collection_name=self.collection,
+            payload=payload,
+            points=qm.Filter(must=[qm.FieldCondition(key="doc_id", match=qm.MatchValue(value=doc_id))]),
+            wait=True,
+        )
+
+    @staticmethod
+    def build_filter(
+        doc_ids: List[str] | None = None,
+        langs: List[str] | None = None,
+        classifications: List[str] | None = None,
+        mime_types: List[str] | None = None,
+        uploaded_from=None,
+        uploaded_to=None,
+    ) -> qm.Filter | None:
+        """
+        Filter over the indexed payload fields; list values match any of
+        their items, and all given fields must match. None when unfiltered.
+        """
+        must = []
+        for key, values in (
+            ("doc_id", doc_ids), ("lang", langs),
+            ("classification", classifications), ("mime_type", mime_types),
+        ):
+            if values:
+                must.append(qm.FieldCondition(key=key, match=qm.MatchAny(any=list(values))))
+        if uploaded_from or uploaded_to:
+            must.append(qm.FieldCondition(key="uploaded_at", range=qm.DatetimeRange(gte=uploaded_from, lte=uploaded_to)))
+        return qm.Filter(must=must) if must else None
 
     def delete_document(self, doc_id: str):
-        # First try: filter delete (requires index)
-        try:
+        self.delete_documents([doc_id])
+
+    def delete_documents(self, doc_ids: List[str], batch_size: int = 1000):
+        """
+        Deletes every point of the given documents through the indexed doc_id
+        filter (MatchAny, batch_size ids per request). Errors propagate.
+        """
+        doc_ids = list(doc_ids)
+        for start in range(0, len(doc_ids), batch_size):
             self.client.delete(
                 collection_name=self.collection,
                 points_selector=qm.FilterSelector(
-                    filter=qm.Filter(
-                        must=[qm.FieldCondition(key="doc_id", match=qm.MatchValue(value=doc_id))]
-                    )
+                    filter=self.build_filter(doc_ids=doc_ids[start:start + batch_size])
                 ),
                 wait=True,
             )
-            return
-        except Exception:
-            # Fallback: scroll to collect point IDs by payload and delete by ID (no index needed)
-            collected_ids = []
-            next_page = None
-            while True:
-                res = self.client.scroll(
-                    collection_name=self.collection,
-                    with_payload=True,
-                    with_vectors=False,
-                    limit=1000,
-                    offset=next_page,
-                    # Filter-less scroll; filter later in Python to avoid index requirement
-                )
-                points, next_page = res
-                if not points:
-                    break
-                for p in points:
-                    if (p.payload or {}).get("doc_id") == doc_id:
-                        collected_ids.append(p.id)
-                if next_page is None:
-                    break
-            if collected_ids:
-                self.client.delete(
-                    collection_name=self.collection,
-                    points_selector=qm.PointIdsList(points=collected_ids),
-                    wait=True,
-                )
 
-    def search(self, query_vec, k: int = 10):
-        return self.client.search(
-            collection_name=self.collection,
-            query_vector=query_vec.tolist(),
+    def document_chunks(self, doc_id: str, batch_size: int = 1000) -> dict:
+        """Point id -> (page_start, page_end) of every indexed chunk of a document (no vectors read)."""
+        out = {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection,
+                scroll_filter=self.build_filter(doc_ids=[doc_id]),
+                limit=batch_size,
+                offset=offset,
+                with_payload=["page_start", "page_end"],
+                with_vectors=False,
+            )
+            for p in points:
+                payload = p.payload or {}
+                out[str(p.id)] = (payload.get("page_start"), payload.get("page_end"))
+            if offset is None:
+                break
+        return out
+
+    def delete_points(self, point_ids: List[str], batch_size: int = 1000):
+        point_ids = list(point_ids)
+        for start in range(0, len(point_ids), batch_size):
+            self.client.delete(
+                collection_name=self.collection,
+                points_selector=qm.PointIdsList(points=point_ids[start:start + batch_size]),
+                wait=True,
+            )
+
+    def iter_doc_id_batches(self, batch_size: int = 1000):
+        """
+        Scrolls the collection reading only the doc_id payload field and
+        yields the set of doc_ids seen in each page of batch_size points.
+        """
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection,
+                limit=batch_size,
+                offset=offset,
+                with_payload=["doc_id"],
+                with_vectors=False,
+            )
+            ids = {(p.payload or {}).get("doc_id") for p in points}
+            ids.discard(None)
+            if ids:
+                yield ids
+            if offset is None:
+                break
+
+    def _query_request(
+        self, query_vec, query_text: str | None, k: int, mode: str, query_filter: qm.Filter | None,
+        prefetch_limit: int | None = None,
+    ) -> qm.QueryRequest:
+        """
+        mode="dense": cosine similarity on the embedding (query_vec).
+        mode="sparse": BM25 over the stored sparse vectors (query_text).
+        mode="hybrid": both retrievals as prefetches of one query (each
+        `prefetch_limit` candidates, default max(k, HYBRID_PREFETCH_LIMIT)),
+        fused server-side with reciprocal-rank fusion.
+        Sparse/hybrid fall back to dense when the collection has no sparse vectors.
+        """
+        if mode != "dense" and (not self.sparse or not query_text):
+            mode = "dense"
+        if mode == "dense":
+            return qm.QueryRequest(
+                query=np.asarray(query_vec, dtype=np.float32).tolist(),
+                limit=k, with_payload=True, params=self.search_params(), filter=query_filter,
+            )
+        sparse_query = self._sparse(query_text, query=True)
+        if mode == "sparse":
+            return qm.QueryRequest(
+                query=sparse_query, using=SPARSE_VECTOR, limit=k, with_payload=True, filter=query_filter,
+            )
+        prefetch_limit = prefetch_limit or max(k, settings.HYBRID_PREFETCH_LIMIT)
+        return qm.QueryRequest(
+            prefetch=[
+                qm.Prefetch(
+                    query=np.asarray(query_vec, dtype=np.float32).tolist(),
+                    limit=prefetch_limit, params=self.search_params(), filter=query_filter,
+                ),
+                qm.Prefetch(query=sparse_query, using=SPARSE_VECTOR, limit=prefetch_limit, filter=query_filter),
+            ],
+            query=qm.FusionQuery(fusion=qm.Fusion.RRF),
             limit=k,
-            with_payload=True
-        )
\ No newline at end of file
+            with_payload=True,
+            filter=query_filter,
+        )
+
+    def search(
+        self, query_vec, k: int = 10, query_text: str | None = None, mode: str = "dense",
+        query_filter: qm.Filter | None = None,
+    ):
+        """
+        Top-k chunks for one query (see _query_request for the modes).
+        `query_filter` (see build_filter) is evaluated by Qdrant during the
+        index traversal, so k results are returned even for narrow filters.
+        """
+        return self.search_batch(
+            None if query_vec is None else [query_vec], [query_text], k=k, mode=mode, query_filter=query_filter,
+        )[0]
+
+    def search_batch(
+        self, query_vecs, query_texts: List[str], k: int = 10, mode: str = "dense",
+        query_filter: qm.Filter | None = None,
+    ) -> list:
+        """
+        Runs many queries in one Query API batch request; returns one hit
+        list per query, in order.
+        """
+        self._check_readable()
+        requests = [
+            self._query_request(None if query_vecs is None else query_vecs[i], text, k, mode, query_filter)
+            for i, text in enumerate(query_texts)
+        ]
+        results = _read_retry(self.client.query_batch_points)(collection_name=self.collection, requests=requests)
+        return [res.points for res in results]
+
+    def search_groups(
+        self, query_vec, query_text: str | None = None, groups: int = 5, group_size: int = 3,
+        mode: str = "dense", query_filter: qm.Filter | None = None, dedupe: bool = False,
+    ) -> list:
+        """
+        Best `groups` documents with up to `group_size` chunks each, via
+        Qdrant point groups on doc_id (one long document can no longer fill
+        every slot). With `dedupe`, chunks whose page range overlaps a
+        better-scoring chunk of the same document are dropped; extra
+        candidates are fetched so groups stay full where possible.
+        Returns [(doc_id, hits)] ordered by each document's best score.
+        """
+        self._check_readable()
+        fetch_size = group_size * 2 if dedupe else group_size
+        # Hybrid groups are formed from the fused prefetch candidates only; fetch enough that a single
+        # long document with many similar chunks cannot fill both prefetches on its own
+        prefetch_limit = max(settings.HYBRID_PREFETCH_LIMIT, groups * fetch_size * settings.HYBRID_GROUP_PREFETCH_FACTOR)
+        req = self._query_request(query_vec, query_text, groups, mode, query_filter, prefetch_limit)
+        res = _read_retry(self.client.query_points_groups)(
+            collection_name=self.collection,
+            group_by="doc_id",
+            query=req.query,
+            using=req.using,
+            prefetch=req.prefetch,
+            query_filter=req.filter,
+            search_params=req.params,
+            limit=groups,
+            group_size=fetch_size,
+            with_payload=True,
+        )
+        out = []
+        for g in res.groups:
+            hits = self._drop_overlapping(g.hits) if dedupe else g.hits
+            out.append((str(g.id), hits[:group_size]))
+        return out
+
+    @staticmethod
+    def _drop_overlapping(hits) -> list:
+        kept, spans = [], []
+        for h in hits:  # best score first
+            p = h.payload or {}
+            start, end = p.get("page_start", 0), p.get("page_end", p.get("page_start", 0))
+            if any(start <= e and s <= end for s, e in spans):
+                continue
+            kept.append(h)
+            spans.append((start, end))
+        return kept
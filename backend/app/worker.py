@@ -1,17 +1,8 @@
-from celery import Celery
+from celery import Celery, chain
 from app.core.config import settings
-from app.db.database import SessionLocal
-from app.db import models, crud
-from app.services.parsing_service import parse_document
-from app.services.chunking import chunk_pages
-from app.services.embeddings import EmbeddingService
-from app.services.vector_store_qdrant import VectorStore
-from app.services.ai_processor import AIProcessor
+from app.services import ingest_pipeline as pipeline
 
-# Import the new Ollama VLM service and its model constant
-from app.services.vision_service_ollama import get_image_caption_with_ollama_vlm, VISION_MODEL
-
-# [cite_start]Initialize Celery [cite: 23]
+# Initialize Celery
 celery_app = Celery(
     "worker",
     broker=settings.CELERY_BROKER_URL,
@@ -19,78 +10,98 @@ celery_app = Celery(
 )
 celery_app.conf.update(
     task_track_started=True,
-    broker_connection_retry_on_startup=True
+    broker_connection_retry_on_startup=True,
+    # Stages are long-running; do not let one worker hoard queued documents
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    # Each stage runs on its own queue so OCR, embedding, LLM and VLM pools scale independently:
+    #   celery -A app.worker.celery_app worker -Q parse_ocr --concurrency=8
+    #   celery -A app.worker.celery_app worker -Q embed --concurrency=1
+    task_routes={
+        "parse_document_task": {"queue": "parse_ocr"},
+        # Legacy entry point; it only dispatches the chain, so any parse worker can take it
+        "process_document_task": {"queue": "parse_ocr"},
+        "embed_document_task": {"queue": "embed"},
+        "analyse_document_task": {"queue": "llm"},
+        "caption_document_task": {"queue": "vision"},
+        "reconcile_vectors_task": {"queue": "embed"},
+        # Long-running re-index on its own worker, so ingestion keeps its embed worker meanwhile:
+        #   celery -A app.worker.celery_app worker -Q reindex --concurrency=1
+        "rebuild_collection_task": {"queue": "reindex"},
+    },
 )
+if settings.VECTOR_GC_INTERVAL_MINUTES > 0:
+    # Needs `celery -A app.worker.celery_app beat` running alongside the workers
+    celery_app.conf.beat_schedule = {
+        "reconcile-vectors": {
+            "task": "reconcile_vectors_task",
+            "schedule": settings.VECTOR_GC_INTERVAL_MINUTES * 60,
+        },
+    }
 
-@celery_app.task(name="process_document_task")
-def process_document_task(doc_id: str, storage_uri: str, filename: str, content_type: str):
-    """
-    [cite_start]This is the Celery task that processes a document concurrently. [cite: 23, 24]
-    It now handles both text analysis with a standard LLM and image analysis with a VLM.
-    """
+def _run_stage(task, doc_id: str, stage: str, fn):
     try:
-        # [cite_start]1. Parse document to extract text and save image files [cite: 24]
-        pages, meta = parse_document(storage_uri)
+        # Skipped when the stage's checkpoint is already recorded (retry / reprocess)
+        pipeline.run_stage(doc_id, stage, fn)
+    except Exception as e:
+        if task.request.retries < settings.PIPELINE_MAX_RETRIES:
+            # Retry only this stage; earlier stages stay checkpointed
+            raise task.retry(exc=e, countdown=2 ** task.request.retries * 10)
+        # If anything fails, mark the document with an error status
+        pipeline.mark_failed(doc_id, stage, e)
+        raise
+    # Only the document id travels between stages; inputs are re-read from Postgres
+    return doc_id
 
-        # [cite_start]2. Update document metadata and page info in DB [cite: 24]
-        with SessionLocal() as db:
-            db.query(models.Document).filter(models.Document.id == doc_id).update({
-                "language_primary": meta.language_primary,
-                "ocr_applied": meta.ocr_applied,
-                "page_count": len(pages)
-            })
-            for p in pages:
-                page_row = models.Page(
-    doc_id=doc_id, page_number=p.page_number, text_raw=p.text_raw,
-    text_ocr=p.text_ocr, lang_detected=p.lang_detected, has_images=p.has_images
-)
-                db.add(page_row)
-            db.commit()
+@celery_app.task(name="parse_document_task", bind=True)
+def parse_document_task(self, doc_id: str):
+    """Parse the stored file (with OCR fallback) and persist its pages."""
+    return _run_stage(self, doc_id, pipeline.STAGE_PARSE, pipeline.parse_stage)
 
-        # [cite_start]3. Chunk text, create embeddings, and upsert to vector store [cite: 27]
-        chunks = chunk_pages(pages, doc_id=doc_id)
-        emb = EmbeddingService()
-        vectors = emb.embed_chunks(chunks)
-        vs = VectorStore()
-        vs.upsert_chunks(doc_id, chunks, vectors)
+@celery_app.task(name="embed_document_task", bind=True)
+def embed_document_task(self, doc_id: str):
+    """Chunk the persisted pages, embed them and upsert to the vector store."""
+    return _run_stage(self, doc_id, pipeline.STAGE_INDEX, pipeline.index_stage)
 
-        # 4. AI TEXT ANALYSIS (using the default Ollama text model)
-        ai_text_processor = AIProcessor()
-        text_outputs = ai_text_processor.process_document(chunks)
+@celery_app.task(name="analyse_document_task", bind=True)
+def analyse_document_task(self, doc_id: str):
+    """Summary, classification and extraction with the configured text LLM."""
+    return _run_stage(self, doc_id, pipeline.STAGE_ANALYSE, pipeline.analyse_stage)
 
-        # 5. AI IMAGE ANALYSIS (using the dedicated Ollama VLM)
-        with SessionLocal() as db:
-            # Retrieve records of images that were extracted during parsing
-            images_to_process = crud.get_images_for_doc(db, doc_id)
-            for image in images_to_process:
-                # Get a caption for each image using the VLM
-                caption = get_image_caption_with_ollama_vlm(image.storage_uri)
-                # Save the caption to the database
-                crud.save_caption_for_image(
-                    db,
-                    image_id=image.id,
-                    caption=caption,
-                    model_version=VISION_MODEL
-                )
+@celery_app.task(name="caption_document_task", bind=True)
+def caption_document_task(self, doc_id: str):
+    """Caption extracted images with the Ollama VLM, then mark the document complete."""
+    _run_stage(self, doc_id, pipeline.STAGE_CAPTION, pipeline.caption_stage)
+    pipeline.mark_completed(doc_id)
+    return doc_id
 
-        # [cite_start]6. Persist TEXT AI outputs and mark document as complete [cite: 28]
-        with SessionLocal() as db:
-            ai_out = models.AIOutput(
-                doc_id=doc_id,
-                summary=text_outputs.summary,
-                classification=text_outputs.classification.label,
-                classification_confidence=text_outputs.classification.confidence,
-                extraction=text_outputs.extraction,
-                model_version=text_outputs.model_version
-            )
-            db.add(ai_out)
-            db.query(models.Document).filter(models.Document.id == doc_id).update({"status": "completed"})
-            db.commit()
-    except Exception as e:
-        # [cite_start]If anything fails, mark the document with an error status [cite: 29]
-        print(f"Error processing document {doc_id}: {e}")
-        with SessionLocal() as db:
-            db.query(models.Document).filter(models.Document.id == doc_id).update({"status": "failed"})
-            db.commit()
+@celery_app.task(name="reconcile_vectors_task")
+def reconcile_vectors_task():
+    """Remove vector store points whose document no longer exists in Postgres."""
+    return pipeline.remove_orphan_vectors()
 
-    return {"doc_id": doc_id, "status": "completed"}
\ No newline at end of file
+@celery_app.task(name="rebuild_collection_task")
+def rebuild_collection_task(drop_old: bool = False):
+    """Fill the versioned collection for the worker's model/chunking config, then switch the alias to it."""
+    return pipeline.rebuild_collection(drop_old=drop_old)
+
+def document_pipeline(doc_id: str):
+    """The ingestion chain for one document; each link runs on its own queue."""
+    return chain(
+        parse_document_task.si(doc_id),
+        embed_document_task.si(doc_id),
+        analyse_document_task.si(doc_id),
+        caption_document_task.si(doc_id),
+    )
+
+def enqueue_document(doc_id: str):
+    return document_pipeline(doc_id).apply_async()
+
+@celery_app.task(name="process_document_task")
+def process_document_task(doc_id: str, storage_uri: str = "", filename: str = "", content_type: str = ""):
+    """
+    Entry point for background processing of an uploaded document.
+    Dispatches the staged chain (parse_ocr -> embed -> llm -> vision) and returns immediately.
+    """
+    result = enqueue_document(doc_id)
+    return {"doc_id": doc_id, "pipeline_id": result.id}
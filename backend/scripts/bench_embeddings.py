@@ -0,0 +1,92 @@
+"""
+Compares the PyTorch and ONNX Runtime embedding backends: throughput
+(texts/s) and retrieval agreement (cosine between the two vectors of the
+same text, and top-k neighbour overlap over the sample corpus).
+
+Texts come from the Page rows in Postgres (--from-db, default) or a text
+file with one passage per line (--file).
+
+Usage (from backend/):
+    python -m scripts.bench_embeddings [--file passages.txt] [--limit 2000] [--k 10]
+"""
+import argparse
+import time
+import numpy as np
+from app.core.config import settings
+
+
+def _load_texts(args) -> list[str]:
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()][: args.limit]
+    from app.db.database import SessionLocal
+    from app.db import models
+    from app.services.chunking import iter_chunks
+    from app.services.parsing_service import ParsedPage
+    with SessionLocal() as db:
+        rows = db.query(models.Page.text_ocr, models.Page.text_raw).limit(args.limit).all()
+    # Each page chunked on its own, as the ingest pipeline would size it
+    return [
+        c.text
+        for i, (ocr, raw) in enumerate(rows) if (ocr or raw)
+        for c in iter_chunks([ParsedPage(i + 1, raw, ocr, None, False)], "bench")
+    ][: args.limit]
+
+
+def _timed(name: str, encoder, texts: list[str], batch_size: int) -> np.ndarray:
+    encoder.encode(texts[:batch_size], batch_size=batch_size, normalize_embeddings=True)  # warm-up
+    t0 = time.perf_counter()
+    mat = np.asarray(encoder.encode(texts, batch_size=batch_size, normalize_embeddings=True), dtype=np.float32)
+    dt = time.perf_counter() - t0
+    print(f"{name:<12} {len(texts) / dt:8.1f} texts/s  ({dt:.2f}s for {len(texts)})")
+    return mat
+
+
+def _topk(mat: np.ndarray, k: int) -> np.ndarray:
+    sims = mat @ mat.T
+    np.fill_diagonal(sims, -np.inf)
+    return np.argsort(-sims, axis=1)[:, :k]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--file")
+    ap.add_argument("--limit", type=int, default=2000)
+    ap.add_argument("--batch-size", type=int, default=32)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--threads", type=int, default=settings.EMBEDDING_THREADS)
+    args = ap.parse_args()
+
+    texts = _load_texts(args)
+    if len(texts) <= args.k:
+        raise SystemExit(f"need more than {args.k} texts, got {len(texts)}")
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from app.services.embedding_onnx import OnnxSentenceEncoder
+    if args.threads > 0:
+        torch.set_num_threads(args.threads)
+
+    results = {"torch": _timed("torch", SentenceTransformer(settings.EMBEDDING_MODEL, device="cpu"), texts, args.batch_size)}
+    for quantized in (False, True):
+        name = "onnx-int8" if quantized else "onnx-fp32"
+        try:
+            enc = OnnxSentenceEncoder(settings.EMBEDDING_ONNX_DIR, quantized=quantized, threads=args.threads)
+        except FileNotFoundError as e:
+            print(f"{name:<12} skipped: {e}")
+            continue
+        results[name] = _timed(name, enc, texts, args.batch_size)
+
+    ref = results["torch"]
+    ref_top = _topk(ref, args.k)
+    for name, mat in results.items():
+        if name == "torch":
+            continue
+        cos = np.sum(ref * mat, axis=1)
+        top = _topk(mat, args.k)
+        overlap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(ref_top, top)])
+        print(f"{name:<12} cosine vs torch: mean {cos.mean():.4f} min {cos.min():.4f}  top-{args.k} overlap {overlap:.3f}")
+
+
+if __name__ == "__main__":
+    main()
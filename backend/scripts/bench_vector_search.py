@@ -0,0 +1,90 @@
+"""
+Latency/recall baseline for the vector store backends on synthetic data:
+the in-process local index (exact and HNSW) and Qdrant. Points go to a
+throw-away collection ("bench_<n>_<dim>") that is deleted afterwards.
+
+Usage (from backend/):
+    python -m scripts.bench_vector_search [--n 50000] [--dim 768] [--queries 200] [--k 10] [--backends local,qdrant]
+"""
+import argparse
+import shutil
+import tempfile
+import time
+import uuid
+from types import SimpleNamespace
+import numpy as np
+from app.core.config import settings
+
+
+def _chunks(doc_id: str, n: int, offset: int) -> list:
+    return [
+        SimpleNamespace(
+            chunk_id=str(uuid.uuid5(uuid.NAMESPACE_URL, f"bench:{offset + i}")), doc_id=doc_id,
+            page_start=1, page_end=1, lang=None, text="",
+        )
+        for i in range(n)
+    ]
+
+
+def _run(name: str, store, vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int):
+    t0 = time.perf_counter()
+    writer = store.writer()
+    for start in range(0, len(vectors), 1000):
+        part = vectors[start:start + 1000]
+        store.upsert_chunks(f"bench-{start // 1000}", _chunks(f"bench-{start // 1000}", len(part), start), part, writer=writer)
+    writer.flush()
+    print(f"{name:<14} upsert {len(vectors) / (time.perf_counter() - t0):9.0f} points/s")
+    store.search(queries[0], k=k)  # warm-up (loads / builds the index)
+    lat, hits = [], []
+    for q in queries:
+        t = time.perf_counter()
+        res = store.search(q, k=k)
+        lat.append((time.perf_counter() - t) * 1000.0)
+        hits.append({str(h.id) for h in res})
+    ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, f"bench:{i}")) for i in range(len(vectors))]
+    recall = np.mean([len(h & {ids[i] for i in row}) / k for h, row in zip(hits, truth)])
+    print(f"{name:<14} p50 {np.percentile(lat, 50):7.2f} ms  p95 {np.percentile(lat, 95):7.2f} ms  recall@{k} {recall:.3f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--n", type=int, default=50000)
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--backends", default="local,qdrant")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(args.n, args.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.choice(args.n, args.queries, replace=False)] + 0.1 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.k]
+
+    settings.COLLECTION_NAME = f"bench_{args.n}_{args.dim}"
+    settings.COLLECTION_VERSIONING = False
+    settings.EMBEDDING_DIM = args.dim
+    backends = args.backends.split(",")
+    if "local" in backends:
+        from app.services.vector_store_local import LocalVectorStore
+        root = tempfile.mkdtemp(prefix="vector_bench_")
+        settings.LOCAL_INDEX_DIR = root
+        try:
+            for label, min_points in (("local-exact", args.n + 1), ("local-hnsw", 0)):
+                settings.LOCAL_HNSW_MIN_POINTS = min_points
+                LocalVectorStore._indexes = {}
+                shutil.rmtree(root, ignore_errors=True)
+                _run(label, LocalVectorStore(), vectors, queries, truth, args.k)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    if "qdrant" in backends:
+        from app.services.vector_store_qdrant import VectorStore
+        store = VectorStore()
+        try:
+            _run("qdrant", store, vectors, queries, truth, args.k)
+        finally:
+            store.client.delete_collection(settings.COLLECTION_NAME)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Exports EMBEDDING_MODEL to ONNX (+ a dynamically int8-quantized copy) for
+EMBEDDING_BACKEND=onnx.
+
+Usage (from backend/):
+    python -m scripts.export_onnx_embeddings [--out DIR] [--opset 17]
+"""
+import argparse
+import os
+import torch
+from transformers import AutoModel, AutoTokenizer
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from app.core.config import settings
+from app.services.embedding_onnx import ONNX_FP32_FILE, ONNX_INT8_FILE
+
+
+class _Encoder(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--model", default=settings.EMBEDDING_MODEL)
+    ap.add_argument("--out", default=settings.EMBEDDING_ONNX_DIR)
+    ap.add_argument("--opset", type=int, default=17)
+    args = ap.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    model = AutoModel.from_pretrained(args.model).eval()
+    tokenizer.save_pretrained(args.out)
+
+    sample = tokenizer(["query: export sample"], return_tensors="pt")
+    fp32_path = os.path.join(args.out, ONNX_FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            _Encoder(model),
+            (sample["input_ids"], sample["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "seq"},
+                "attention_mask": {0: "batch", 1: "seq"},
+                "last_hidden_state": {0: "batch", 1: "seq"},
+            },
+            opset_version=args.opset,
+        )
+    print(f"wrote {fp32_path}")
+
+    int8_path = os.path.join(args.out, ONNX_INT8_FILE)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"wrote {int8_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""
+Removes vector store points whose document no longer exists in Postgres
+(the same job the Celery beat schedule runs every VECTOR_GC_INTERVAL_MINUTES).
+
+Usage (from backend/):
+    python -m scripts.reconcile_vectors [--batch-size N]
+"""
+import argparse
+from app.services.ingest_pipeline import remove_orphan_vectors
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--batch-size", type=int, default=1000, help="points scrolled per batch")
+    args = ap.parse_args()
+    print(remove_orphan_vectors(args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""
+Blue/green re-index: builds the versioned Qdrant collection for the current
+EMBEDDING_MODEL / EMBEDDING_DIM / CHUNK_MAX_TOKENS / CHUNK_OVERLAP_TOKENS from the stored
+page text and then switches the QDRANT_COLLECTION alias to it in one atomic
+step. Run it with the *new* settings while the API and workers keep serving
+the old collection; restart them with the new settings afterwards and run it
+once more to re-index documents they completed into the old collection
+meanwhile (with the alias already switched only those are re-indexed).
+
+Usage (from backend/):
+    EMBEDDING_MODEL=... python -m scripts.reindex_collection [--drop-old] [--force]
+"""
+import argparse
+from app.services.ingest_pipeline import rebuild_collection
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--drop-old", action="store_true", help="delete the previously live collection after the switch (no __legacy copy is kept)")
+    ap.add_argument("--force", action="store_true", help="re-index everything even if the alias already points at this version")
+    args = ap.parse_args()
+    rebuild_collection(drop_old=args.drop_old, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
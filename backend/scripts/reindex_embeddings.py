@@ -0,0 +1,22 @@
+"""
+Re-embeds and upserts the chunks of stored documents (backfill after a
+chunking/model/collection change). Uses length-bucketed batches and, with
+--processes > 1, a multi-process encode pool; reports chunks/s.
+
+Usage (from backend/):
+    python -m scripts.reindex_embeddings [--doc-id ID ...] [--processes N]
+"""
+import argparse
+from app.services.ingest_pipeline import reindex_documents
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--doc-id", action="append", dest="doc_ids", help="repeatable; default: all completed documents")
+    ap.add_argument("--processes", type=int, default=None, help="encode processes (default EMBED_BULK_PROCESSES)")
+    args = ap.parse_args()
+    reindex_documents(args.doc_ids, processes=args.processes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import pytest
+from app.core.config import settings
+from app.services import chunking
+from app.services.parsing_service import ParsedPage
+
+DOC_ID = "doc-1"
+
+PAGES = [
+    "Invoice 2024-117 for consulting services. Payment is due within thirty days of receipt.\n\n"
+    "Late payments accrue interest at two percent per month. Questions go to accounts@example.com.",
+    "Thank you for your business.",
+    "Terms and conditions apply to every order. All prices exclude VAT unless stated otherwise.",
+    "Thank you for your business.",
+]
+
+
+def _pages(texts) -> list:
+    return [ParsedPage(page_number=n + 1, text_raw=t, text_ocr=None, lang_detected="en", has_images=False)
+            for n, t in enumerate(texts)]
+
+
+@pytest.fixture
+def estimate(monkeypatch):
+    """Character-estimate mode, as when the tokenizer cannot be loaded."""
+    monkeypatch.setattr(chunking, "_tokenizer", None)
+    monkeypatch.setattr(chunking, "_tokenizer_loaded", True)
+    monkeypatch.setattr(settings, "CHUNK_MAX_TOKENS", 24)
+    monkeypatch.setattr(settings, "CHUNK_OVERLAP_TOKENS", 6)
+
+
+def test_chunk_ids_are_stable(estimate):
+    first = chunking.chunk_pages(_pages(PAGES), DOC_ID)
+    second = chunking.chunk_pages(_pages(PAGES), DOC_ID)
+    assert [c.chunk_id for c in first] == [c.chunk_id for c in second]
+    assert len({c.chunk_id for c in first}) == len(first)
+
+
+def test_chunk_ids_are_pinned(estimate):
+    # These ids are stored as Qdrant point ids; if this test has to change, bump CHUNKER_VERSION
+    chunks = chunking.chunk_pages(_pages(PAGES), DOC_ID)
+    assert [(c.page_start, c.page_end, c.chunk_id) for c in chunks] == PINNED_ESTIMATE_IDS
+
+
+def test_edit_only_changes_affected_chunks(estimate):
+    before = chunking.chunk_pages(_pages(PAGES), DOC_ID)
+    edited = PAGES[:2] + [PAGES[2].replace("exclude", "include")] + PAGES[3:]
+    after = chunking.chunk_pages(_pages(edited), DOC_ID)
+    gone = {c.chunk_id for c in before} - {c.chunk_id for c in after}
+    assert gone == {c.chunk_id for c in before if "exclude VAT" in c.text}
+
+
+def test_repeated_text_gets_distinct_ids(estimate, monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_MAX_TOKENS", 10)
+    chunks = chunking.chunk_pages(_pages([PAGES[1]] * 3), DOC_ID)
+    assert [c.text for c in chunks] == [PAGES[1]] * 3
+    assert len({c.chunk_id for c in chunks}) == 3
+    assert chunks == chunking.chunk_pages(_pages([PAGES[1]] * 3), DOC_ID)
+
+
+def test_ids_depend_on_document(estimate):
+    a = chunking.chunk_pages(_pages(PAGES), "doc-a")
+    b = chunking.chunk_pages(_pages(PAGES), "doc-b")
+    assert [c.text for c in a] == [c.text for c in b]
+    assert {c.chunk_id for c in a}.isdisjoint(c.chunk_id for c in b)
+
+
+def test_tokenizer_mode_is_part_of_the_version(monkeypatch):
+    monkeypatch.setattr(chunking, "_tokenizer_loaded", True)
+    monkeypatch.setattr(chunking, "_tokenizer", None)
+    estimated = chunking.chunker_version()
+    monkeypatch.setattr(chunking, "_tokenizer", object())
+    assert chunking.chunker_version() == chunking.CHUNKER_VERSION
+    assert estimated != chunking.CHUNKER_VERSION
+
+
+PINNED_ESTIMATE_IDS = [
+    (1, 1, "535a8f5d-9a99-529d-9921-9f24861c7392"),
+    (1, 1, "615cdae8-b5c4-56d9-8552-07e216aac690"),
+    (1, 1, "95fd6c04-40ae-5434-a79c-95a3aec67ec5"),
+    (1, 2, "7af6d364-6380-582a-8dad-554cfc686e21"),
+    (3, 3, "321848ca-9e5b-55fa-935f-309469540279"),
+    (3, 4, "0a87f197-3489-55ff-afad-ad8b0ed52ddc"),
+]
@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.services.chunking import Chunk
+from app.services.vector_store_local import LocalIndex, LocalVectorStore
+from app.services.vector_store_qdrant import VectorStore
+
+DIM = 8
+
+
+def _vec(i: int) -> np.ndarray:
+    v = np.zeros(DIM, dtype=np.float32)
+    v[i % DIM] = 1.0
+    v[(i + 1) % DIM] = 0.1
+    return v
+
+
+def _upsert(index: LocalIndex, doc_id: str, ids: list, lang: str = "en", start: int = 0):
+    index.upsert(
+        ids,
+        [doc_id] * len(ids),
+        [{"doc_id": doc_id, "chunk_id": pid, "lang": lang, "page_start": n, "page_end": n}
+         for n, pid in enumerate(ids)],
+        np.stack([_vec(start + n) for n in range(len(ids))]),
+    )
+
+
+def _ids(hits) -> list:
+    return [h.payload["chunk_id"] for h in hits]
+
+
+@pytest.fixture(params=["exact", "hnsw"])
+def search_mode(request, monkeypatch):
+    if request.param == "hnsw":
+        pytest.importorskip("hnswlib")
+        monkeypatch.setattr(settings, "LOCAL_HNSW_MIN_POINTS", 1)
+    else:
+        monkeypatch.setattr(settings, "LOCAL_HNSW_MIN_POINTS", 1_000_000)
+    return request.param
+
+
+@pytest.fixture
+def index(tmp_path, search_mode):
+    return LocalIndex(str(tmp_path / "index"))
+
+
+def _search(index: LocalIndex, vec, limit: int, flt=None) -> list:
+    return [index.point(s, score).payload["chunk_id"] for s, score in index.ranked(vec, limit, flt)]
+
+
+def test_upsert_and_search(index, search_mode):
+    _upsert(index, "d1", ["a", "b", "c"])
+    assert _search(index, _vec(1), 1) == ["b"]
+    assert sorted(_search(index, _vec(0), 10)) == ["a", "b", "c"]
+    assert index.stats() == {"points": 3, "dim": DIM, "hnsw": search_mode == "hnsw"}
+
+
+def test_upsert_replaces_existing_point(index):
+    _upsert(index, "d1", ["a", "b"])
+    _upsert(index, "d1", ["a"], start=5)
+    assert index.stats()["points"] == 2
+    assert _search(index, _vec(5), 1) == ["a"]
+
+
+def test_delete_documents_and_points(index):
+    _upsert(index, "d1", ["a", "b"])
+    _upsert(index, "d2", ["c", "d"], start=2)
+    index.delete_documents(["d1"])
+    assert sorted(_search(index, _vec(0), 10)) == ["c", "d"]
+    index.delete_points(["c"])
+    assert _search(index, _vec(2), 10) == ["d"]
+    assert index.document_points("d2") == {"d": (1, 1)}
+
+
+def test_deleted_slots_are_reused(index):
+    _upsert(index, "d1", ["a", "b"])
+    index.delete_points(["a"])
+    _upsert(index, "d2", ["c"], start=4)
+    assert index.stats()["points"] == 2
+    assert _search(index, _vec(4), 1) == ["c"]
+    assert "a" not in _search(index, _vec(0), 10)
+
+
+def test_search_with_filters(index):
+    _upsert(index, "d1", ["a", "b"], lang="en")
+    _upsert(index, "d2", ["c", "d"], lang="de", start=2)
+    by_doc = VectorStore.build_filter(doc_ids=["d2"])
+    assert sorted(_search(index, _vec(0), 10, by_doc)) == ["c", "d"]
+    by_lang = VectorStore.build_filter(langs=["en"])
+    assert _search(index, _vec(1), 1, by_lang) == ["b"]
+    nothing = VectorStore.build_filter(doc_ids=["d2"], langs=["en"])
+    assert _search(index, _vec(0), 10, nothing) == []
+
+
+def test_set_payload_is_filterable(index):
+    _upsert(index, "d1", ["a"])
+    _upsert(index, "d2", ["b"], start=1)
+    index.set_payload("d1", {"classification": "invoice"})
+    flt = VectorStore.build_filter(classifications=["invoice"])
+    assert _search(index, _vec(1), 10, flt) == ["a"]
+
+
+def test_refresh_across_instances(tmp_path, search_mode):
+    root = str(tmp_path / "index")
+    writer, reader = LocalIndex(root), LocalIndex(root)
+    _upsert(writer, "d1", ["a", "b"])
+    assert sorted(_search(reader, _vec(0), 10)) == ["a", "b"]
+    # Grows the vector file past the reader's mapping
+    many = [f"p{n}" for n in range(1500)]
+    _upsert(writer, "d2", many, start=3)
+    assert reader.stats()["points"] == 2
+    assert len(_search(reader, _vec(0), 2000)) == 1502
+    writer.delete_documents(["d2"])
+    writer.set_payload("d1", {"classification": "memo"})
+    assert sorted(_search(reader, _vec(0), 10)) == ["a", "b"]
+    flt = VectorStore.build_filter(classifications=["memo"])
+    assert len(_search(reader, _vec(0), 10, flt)) == 2
+    # A fresh instance (another process starting up) sees the same state
+    assert sorted(_search(LocalIndex(root), _vec(0), 10)) == ["a", "b"]
+
+
+def test_vector_store_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOCAL_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "LOCAL_HNSW_MIN_POINTS", 1_000_000)
+    store = LocalVectorStore()
+    chunks = [Chunk(f"c{n}", "d1", n + 1, n + 1, 0, 4, "en", f"text {n}") for n in range(3)]
+    store.upsert_chunks("d1", chunks, np.stack([_vec(n) for n in range(3)]), meta={"mime_type": "application/pdf"})
+    assert store.document_chunks("d1") == {"c0": (1, 1), "c1": (2, 2), "c2": (3, 3)}
+    store.delete_points(["c1"])
+    hits = store.search(_vec(1), k=5, query_filter=store.build_filter(mime_types=["application/pdf"]))
+    assert sorted(_ids(hits)) == ["c0", "c2"]
+    groups = store.search_groups(_vec(0), groups=2, group_size=1)
+    assert [(doc_id, _ids(hits)) for doc_id, hits in groups] == [("d1", ["c0"])]